@@ -0,0 +1,335 @@
+"""Offline load test for the interview funnel.
+
+Replays synthetic updates through the real handlers in bot.py with a fake
+Bot API transport and the in-memory storage backend, then prints throughput,
+handler latency percentiles, storage ops and outbound API calls as JSON.
+The startup section runs fresh interpreters and reports import time and
+time to the first handled update.
+
+    python bench.py --users 200 --group-messages 2000 --out bench.json
+    python bench.py --compare bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import statistics
+import subprocess
+from collections import Counter, defaultdict
+
+BENCH_ADMIN_ID = 1000
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ["ADMIN_IDS"] = str(BENCH_ADMIN_ID)
+
+_import_started = time.perf_counter()
+import bot
+IMPORT_SECONDS = time.perf_counter() - _import_started
+from telegram import Update
+from telegram.request import BaseRequest
+
+GROUP_TEXTS = [
+    "hi", "hello everyone", "kaj ki", "ভাই কাজ আছে", "আমি নতুন", "ok thanks", "payment done",
+    "kemon achen sobai", "withdraw kobe hobe", "আলহামদুলিল্লাহ", "income kivabe", "nice",
+]
+WRONG_ANSWERS = ["jani na", "ki bolbo", "???", "asdf"]
+
+# --- FAKE BOT API ---
+class FakeRequest(BaseRequest):
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif endpoint == "getChatAdministrators":
+            result = [{"status": "creator", "user": {"id": BENCH_ADMIN_ID, "is_bot": False, "first_name": "admin"}, "is_anonymous": False}]
+        elif endpoint in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            result = {
+                "message_id": sum(self.calls.values()), "date": int(time.time()), "text": params.get("text", ""),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+# --- FAKE STORAGE ---
+class BenchStorage(bot.MemoryStorage):
+    # প্রতিটি অপারেশনে কৃত্রিম নেটওয়ার্ক ডিলে যোগ করে Firestore এর মতো আচরণ
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+
+    async def _op(self, op, coro):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await super()._op(op, coro)
+
+# --- UPDATE FACTORY ---
+class Updates:
+    def __init__(self, application):
+        self.bot = application.bot
+        self.next_id = 0
+
+    def _id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"U{user_id}"}
+
+    def text(self, user_id, text, chat_id=None, chat_type="private"):
+        uid = self._id()
+        return Update.de_json({"update_id": uid, "message": {
+            "message_id": uid, "date": int(time.time()), "text": text, "from": self._user(user_id),
+            "chat": {"id": chat_id or user_id, "type": chat_type},
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else [],
+        }}, self.bot)
+
+    def button(self, user_id, data):
+        uid = self._id()
+        return Update.de_json({"update_id": uid, "callback_query": {
+            "id": str(uid), "chat_instance": "bench", "data": data, "from": self._user(user_id),
+            "message": {"message_id": uid, "date": int(time.time()), "text": "-", "chat": {"id": user_id, "type": "private"}},
+        }}, self.bot)
+
+def handler_label(update):
+    if update.callback_query:
+        return "button_handler"
+    if update.effective_chat.type != "private":
+        return "handle_group_messages"
+    if update.message.text.startswith("/"):
+        return "start"
+    return "handle_message"
+
+# --- RUNNER ---
+class Run:
+    def __init__(self, application):
+        self.app = application
+        self.latencies = defaultdict(list)
+        self.updates = 0
+
+    async def feed(self, update):
+        label = handler_label(update)
+        started = time.perf_counter()
+        processor = self.app.update_processor
+        if self.app.concurrent_updates > 1:
+            await processor.process_update(update, self.app.process_update(update))
+        else:
+            await self.app.process_update(update)
+        self.latencies[label].append(time.perf_counter() - started)
+        self.updates += 1
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+    return {"count": len(ordered), "mean_ms": statistics.fmean(ordered) * 1000, "p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99)}
+
+async def interview(run, factory, user_id, wrong_rate):
+    await run.feed(factory.text(user_id, "/start"))
+    await run.feed(factory.button(user_id, "start_exam"))
+    await run.feed(factory.button(user_id, "confirm_ready"))
+    for q in bot.QUESTIONS:
+        if random.random() < wrong_rate:
+            await run.feed(factory.text(user_id, random.choice(WRONG_ANSWERS)))
+        await run.feed(factory.text(user_id, random.choice(q["a"])))
+    await run.feed(factory.button(user_id, "accept_terms"))
+    await run.feed(factory.text(user_id, bot.STATIC_CONFIG["final_phrase"]))
+    await run.feed(factory.text(user_id, "Slip"))
+
+async def group_flood(run, factory, messages, groups):
+    async def one(i):
+        chat_id = -1000000000000 - (i % groups)
+        await run.feed(factory.text(50000 + i % 997, random.choice(GROUP_TEXTS), chat_id=chat_id, chat_type="supergroup"))
+    await asyncio.gather(*(one(i) for i in range(messages)))
+
+async def admin_clicks(run, factory, clicks):
+    for _ in range(clicks):
+        await run.feed(factory.button(BENCH_ADMIN_ID, "admin_stats"))
+
+def reset_state(storage_latency):
+    bot.storage = BenchStorage(storage_latency)
+    bot.user_cache = bot.UserStateCache()
+    bot.stats = bot.StatsAggregator()
+    bot.chat_admins = bot.ChatAdminCache()
+    bot.group_replies = bot.GroupReplyCoalescer()
+
+async def run_workload(name, args, body):
+    reset_state(args.storage_latency)
+    request = FakeRequest(args.api_latency)
+    builder = bot.Application.builder().token(os.environ["BOT_TOKEN"]).request(request)
+    if args.concurrency > 1:
+        builder = builder.concurrent_updates(bot.PerUserUpdateProcessor(args.concurrency))
+    application = builder.build()
+    bot.register_handlers(application)
+    await application.initialize()
+    await bot.load_config_to_cache()
+    bot.user_cache.start()
+    bot.stats.start()
+    bot.storage.ops.clear()
+    request.calls.clear()
+
+    run = Run(application)
+    started = time.perf_counter()
+    await body(run, Updates(application))
+    elapsed = time.perf_counter() - started
+    await bot.group_replies.close()
+    await bot.user_cache.close()
+    await bot.stats.close()
+    await application.shutdown()
+    completed = sum(1 for data in bot.storage.users.values() if data.get("passed"))
+
+    storage_ops = dict(bot.storage.ops)
+    result = {
+        "updates": run.updates,
+        "seconds": elapsed,
+        "throughput_ups": run.updates / elapsed if elapsed else 0.0,
+        "latency": {label: percentiles(samples) for label, samples in run.latencies.items()},
+        "latency_all": percentiles([x for samples in run.latencies.values() for x in samples]),
+        "storage_ops": storage_ops,
+        "outbound_calls": dict(request.calls),
+    }
+    if completed:
+        result["completed_interviews"] = completed
+        result["storage_ops_per_interview"] = sum(storage_ops.values()) / completed
+        result["outbound_calls_per_interview"] = sum(request.calls.values()) / completed
+    print(f"{name}: {run.updates} updates in {elapsed:.2f}s ({result['throughput_ups']:.0f}/s)", file=sys.stderr)
+    return result
+
+# --- STARTUP ---
+async def startup_child(args):
+    # নতুন প্রসেসে চলে: ইমপোর্ট থেকে প্রথম আপডেট হ্যান্ডেল হওয়া পর্যন্ত প্রতিটি ধাপের সময়
+    started = time.perf_counter()
+    application = bot.build_application(request=FakeRequest(args.api_latency))
+    await application.initialize()
+    initialized = time.perf_counter()
+    await bot.post_init(application)
+    warmed = time.perf_counter()
+    await application.process_update(Updates(application).text(100000, "/start"))
+    handled = time.perf_counter()
+    await bot.post_stop(application)
+    await bot.post_shutdown(application)
+    await application.shutdown()
+    return {
+        "import_s": IMPORT_SECONDS,
+        "initialize_s": initialized - started,
+        "post_init_s": warmed - initialized,
+        "first_update_s": handled - warmed,
+        "to_first_update_s": IMPORT_SECONDS + handled - started,
+    }
+
+def startup(args):
+    env = {**os.environ, "PORT": "0"}
+    runs = []
+    for _ in range(args.startup_runs):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, __file__, "--startup-child", "--api-latency", str(args.api_latency)],
+                             env=env, capture_output=True, text=True, check=True).stdout
+        run = json.loads(out)
+        run["process_s"] = time.perf_counter() - started
+        runs.append(run)
+    result = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    result["runs"] = len(runs)
+    print(f"startup: import {result['import_s'] * 1000:.0f}ms, first update after {result['to_first_update_s'] * 1000:.0f}ms", file=sys.stderr)
+    return result
+
+async def main(args):
+    random.seed(args.seed)
+
+    async def interviews(run, factory):
+        await asyncio.gather(*(interview(run, factory, 100000 + i, args.wrong_rate) for i in range(args.users)))
+
+    async def flood(run, factory):
+        await group_flood(run, factory, args.group_messages, args.groups)
+
+    async def stats_clicks(run, factory):
+        await admin_clicks(run, factory, args.admin_clicks)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "args": vars(args),
+        },
+        "workloads": {
+            "interviews": await run_workload("interviews", args, interviews),
+            "group_flood": await run_workload("group_flood", args, flood),
+            "admin_stats": await run_workload("admin_stats", args, stats_clicks),
+        },
+        "startup": startup(args) if args.startup_runs else {},
+    }
+
+def delta(a, b):
+    return f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+
+def compare(old, new):
+    # আগের রেজাল্টের সাথে throughput আর p95 এর পরিবর্তন দেখায়
+    for name, cur in new["workloads"].items():
+        prev = old.get("workloads", {}).get(name)
+        if not prev:
+            continue
+        print(f"{name}: throughput {prev['throughput_ups']:.0f} -> {cur['throughput_ups']:.0f} ups ({delta(prev['throughput_ups'], cur['throughput_ups'])}), "
+              f"p95 {prev['latency_all'].get('p95_ms', 0):.2f} -> {cur['latency_all'].get('p95_ms', 0):.2f} ms "
+              f"({delta(prev['latency_all'].get('p95_ms', 0), cur['latency_all'].get('p95_ms', 0))})", file=sys.stderr)
+    prev, cur = old.get("startup"), new.get("startup")
+    if prev and cur:
+        for key in ("import_s", "to_first_update_s"):
+            print(f"startup {key}: {prev[key] * 1000:.0f} -> {cur[key] * 1000:.0f} ms ({delta(prev[key], cur[key])})", file=sys.stderr)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Interview funnel load test")
+    parser.add_argument("--users", type=int, default=200, help="concurrent users running a full interview")
+    parser.add_argument("--wrong-rate", type=float, default=0.2, help="chance of a wrong answer before each right one")
+    parser.add_argument("--group-messages", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=5)
+    parser.add_argument("--admin-clicks", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=bot.UPDATE_CONCURRENCY, help="1 = sequential update processing")
+    parser.add_argument("--storage-latency", type=float, default=0.005, help="simulated seconds per storage op")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="simulated seconds per Bot API call")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--startup-runs", type=int, default=5, help="fresh processes for the startup benchmark, 0 to skip")
+    parser.add_argument("--startup-child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help="write the JSON result here")
+    parser.add_argument("--compare", help="previous JSON result to compare against")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    args = parse_args()
+    if args.startup_child:
+        print(json.dumps(asyncio.run(startup_child(args))))
+        sys.exit()
+    result = asyncio.run(main(args))
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
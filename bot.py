@@ -1,25 +1,47 @@
 import os
+import abc
+import re
 import json
 import logging
 import asyncio
+import hmac
+import secrets
+import contextlib
+import signal
+import urllib.parse
+from http import HTTPStatus
+import time
+import copy
+import io
+import csv
+import zlib
+import tempfile
+import bisect
+import functools
+import operator
+import sqlite3
 import threading
-from datetime import datetime
+import unicodedata
+from types import MappingProxyType
+from collections import Counter, OrderedDict, defaultdict, deque
+from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 
-import firebase_admin
-from firebase_admin import credentials, firestore
-from flask import Flask
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyParameters
 from telegram.constants import ParseMode
+from telegram.error import RetryAfter
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application, 
     CommandHandler, 
     MessageHandler, 
     CallbackQueryHandler, 
+    ChatMemberHandler,
+    BaseUpdateProcessor,
+    BaseRateLimiter,
     filters, 
     ContextTypes
 )
-from rapidfuzz.fuzz import token_set_ratio
 
 # --- CONFIGURATION ---
 TOKEN = os.environ.get("BOT_TOKEN", "")
@@ -34,55 +56,736 @@ except:
     ADMIN_IDS = []
 
 # --- FIREBASE SETUP ---
-if not firebase_admin._apps:
-    if SERVICE_ACCOUNT_JSON:
-        try:
-            cred_dict = json.loads(SERVICE_ACCOUNT_JSON)
-            cred = credentials.Certificate(cred_dict)
-            firebase_admin.initialize_app(cred)
-        except Exception as e:
-            print(f"Firebase Init Error: {e}")
-    else:
-        if os.path.exists("serviceAccountKey.json"):
-            cred = credentials.Certificate("serviceAccountKey.json")
-            firebase_admin.initialize_app(cred)
+# শুধু Firestore ব্যাকএন্ড ব্যবহার হলেই Firebase চালু হয় (লোকাল ব্যাকএন্ডে ক্রেডেনশিয়াল লাগে না)।
+# firebase_admin/google-cloud ইমপোর্ট করতেই কয়েকশো ms লাগে, তাই মডিউল লোডের সময় না করে প্রথম ব্যবহারে করা হয়
+def init_firebase():
+    import firebase_admin
+    from firebase_admin import credentials
+    if not firebase_admin._apps:
+        if SERVICE_ACCOUNT_JSON:
+            try:
+                cred_dict = json.loads(SERVICE_ACCOUNT_JSON)
+                cred = credentials.Certificate(cred_dict)
+                firebase_admin.initialize_app(cred)
+            except Exception as e:
+                print(f"Firebase Init Error: {e}")
+        else:
+            if os.path.exists("serviceAccountKey.json"):
+                cred = credentials.Certificate("serviceAccountKey.json")
+                firebase_admin.initialize_app(cred)
+
+_db = None
 
-db = firestore.client()
-users_ref = db.collection("users")
-settings_ref = db.collection("bot_settings").document("config")
-stats_ref = db.collection("bot_stats").document("general")
+def get_db():
+    global _db
+    if _db is None:
+        from firebase_admin import firestore
+        init_firebase()
+        _db = firestore.client()
+    return _db
 
 # --- PERFORMANCE TUNING ---
-executor = ThreadPoolExecutor(max_workers=20)
+# AsyncClient না থাকলে এই থ্রেডপুল fallback হিসেবে ব্যবহার হয়
+class MeteredExecutor(ThreadPoolExecutor):
+    # /metrics এর জন্য কতগুলো কাজ অপেক্ষায় আর কতগুলো এখন চলছে তা গোনে
+    def __init__(self, max_workers):
+        super().__init__(max_workers=max_workers)
+        self.queued = 0
+        self.active = 0
+        self._count_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        def run():
+            with self._count_lock:
+                self.queued -= 1
+                self.active += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._count_lock:
+                    self.active -= 1
+        with self._count_lock:
+            self.queued += 1
+        return super().submit(run)
+
+executor = MeteredExecutor(max_workers=20)
 
 # --- GLOBAL CACHE (SPEED BOOST) ---
-GLOBAL_CONFIG = {
+# হ্যান্ডলারগুলো সবসময় RAM এর এই স্ন্যাপশট থেকেই কনফিগ পড়ে। স্ন্যাপশট কখনো বদলায় না,
+# নতুন কনফিগ এলে পুরো অবজেক্টটাই একবারে বদলে দেওয়া হয় (atomic swap)
+DEFAULT_CONFIG = {
     "video_link": "https://t.me/skyzoneit/6300",
     "admin_username": "@SKYZONE_IT_ADMIN"
 }
+CONFIG_POLL_INTERVAL = float(os.environ.get("CONFIG_POLL_INTERVAL", 1))
+
+class ConfigSnapshot:
+    __slots__ = ("data", "version")
+
+    def __init__(self, data, version=None):
+        self.data = MappingProxyType(dict(data))
+        self.version = version
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+GLOBAL_CONFIG = ConfigSnapshot(DEFAULT_CONFIG)
+
+# --- METRICS ---
+# হট পাথে খরচ কম রাখতে কাউন্টারগুলো সাধারণ int (সব কাজ এক event loop এ, লক লাগে না),
+# আর সময় মাপা হয় প্রতি METRICS_SAMPLE_EVERY কলে একবার
+METRICS_SAMPLE_EVERY = max(1, int(os.environ.get("METRICS_SAMPLE_EVERY", 4)))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class SampledTimer:
+    # calls সবসময় গোনা হয়, কিন্তু latency শুধু প্রতি N তম কলে মাপা হয়
+    def __init__(self, sample_every=METRICS_SAMPLE_EVERY):
+        self.sample_every = sample_every
+        self.calls = Counter()
+        self.errors = Counter()
+        self.latency = defaultdict(Histogram)
+
+    async def measure(self, label, coro):
+        self.calls[label] += 1
+        if self.calls[label] % self.sample_every:
+            try:
+                return await coro
+            except Exception:
+                self.errors[label] += 1
+                raise
+        started = time.perf_counter()
+        try:
+            return await coro
+        except Exception:
+            self.errors[label] += 1
+            raise
+        finally:
+            self.latency[label].observe(time.perf_counter() - started)
+
+handler_metrics = SampledTimer()
+storage_metrics = SampledTimer()
+
+def instrument(label):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await handler_metrics.measure(label, func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+# --- FIRESTORE ASYNC CLIENT ---
+# firebase-admin এর sync কল থ্রেডপুলে না পাঠিয়ে সরাসরি AsyncClient (একটাই gRPC চ্যানেল) ব্যবহার হয়।
+# AsyncClient তৈরি না হলে বা FIRESTORE_ASYNC=0 হলে আগের executor পথেই চলে।
+FIRESTORE_ASYNC = os.environ.get("FIRESTORE_ASYNC", "1") == "1"
+FIRESTORE_CONCURRENCY = int(os.environ.get("FIRESTORE_CONCURRENCY", 100))
+FIRESTORE_TIMEOUT = float(os.environ.get("FIRESTORE_TIMEOUT", 10))
+
+_async_db = None
+_async_db_failed = not FIRESTORE_ASYNC
+_firestore_slots = None
+
+def get_async_db():
+    # gRPC aio চ্যানেল event loop এর সাথে বাঁধা, তাই প্রথম ব্যবহারের সময় loop এর ভেতরেই তৈরি হয়
+    global _async_db, _async_db_failed, _firestore_slots
+    if _async_db is None and not _async_db_failed:
+        try:
+            from firebase_admin import firestore_async
+            init_firebase()
+            _async_db = firestore_async.client()
+            _firestore_slots = asyncio.Semaphore(FIRESTORE_CONCURRENCY)
+            logger.info("Firestore AsyncClient ready")
+        except Exception as e:
+            _async_db_failed = True
+            logger.error(f"Firestore AsyncClient Error, using executor: {e}")
+    return _async_db
+
+async def _async_call(coro):
+    # timeout শুধু প্রতিটি RPC চেষ্টার জন্য; retry সহ পুরো কলের সীমা wait_for দিয়ে
+    async with _firestore_slots:
+        return await asyncio.wait_for(coro, FIRESTORE_TIMEOUT)
 
 async def async_firestore_get(doc_ref):
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(executor, doc_ref.get)
+    adb = get_async_db()
+    if adb is None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, doc_ref.get)
+    return await _async_call(adb.document(doc_ref.path).get(timeout=FIRESTORE_TIMEOUT))
 
 async def async_firestore_set(doc_ref, data, merge=True):
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(executor, lambda: doc_ref.set(data, merge=merge))
+    adb = get_async_db()
+    if adb is None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, lambda: doc_ref.set(data, merge=merge))
+    return await _async_call(adb.document(doc_ref.path).set(data, merge=merge, timeout=FIRESTORE_TIMEOUT))
 
-# --- FLASK SERVER ---
-app = Flask(__name__)
+async def async_firestore_delete(doc_ref):
+    adb = get_async_db()
+    if adb is None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, doc_ref.delete)
+    return await _async_call(adb.document(doc_ref.path).delete(timeout=FIRESTORE_TIMEOUT))
 
-@app.route('/')
-def home():
-    return "Skyzone IT Bot High-Performance Mode is ON!"
+async def async_firestore_query(build_query):
+    # build_query(client) একই কুয়েরি sync বা async যেকোনো ক্লায়েন্টে বানায়
+    adb = get_async_db()
+    if adb is None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, lambda: list(build_query(get_db()).stream()))
+    async def collect():
+        return [doc async for doc in build_query(adb).stream(timeout=FIRESTORE_TIMEOUT)]
+    return await _async_call(collect())
 
-def run_flask():
-    port = int(os.environ.get("PORT", 10000))
-    try:
-        app.run(host='0.0.0.0', port=port, use_reloader=False)
-    except:
+async def async_firestore_batch(writes):
+    # writes: (doc_ref, data) লিস্ট, সব merge=True; একটাই commit এ যায় (সর্বোচ্চ ৫০০)
+    adb = get_async_db()
+    if adb is None:
+        def commit():
+            batch = get_db().batch()
+            for doc_ref, data in writes:
+                batch.set(doc_ref, data, merge=True)
+            return batch.commit()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, commit)
+    batch = adb.batch()
+    for doc_ref, data in writes:
+        batch.set(adb.document(doc_ref.path), data, merge=True)
+    return await _async_call(batch.commit(timeout=FIRESTORE_TIMEOUT))
+
+# --- STORAGE BACKEND ---
+# ইউজার ডাটা, কনফিগ আর স্ট্যাটস সব এই ইন্টারফেসের পেছনে থাকে।
+# STORAGE_BACKEND: firestore (ডিফল্ট), sqlite (ছোট ডিপ্লয়মেন্ট), memory (টেস্ট/বেঞ্চমার্ক)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "firestore")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "bot.db")
+
+FIRESTORE_BATCH_LIMIT = 500
+
+def apply_user_update(doc, fields, append):
+    # append Firestore ArrayUnion এর মতো: আগে থেকে থাকা আইটেম আবার যোগ হয় না, তাই রিট্রাই নিরাপদ
+    doc.update(fields)
+    for field, values in append.items():
+        items = list(doc.get(field) or [])
+        items += [v for v in values if v not in items]
+        doc[field] = items
+    return doc
+
+QUERY_OPS = {"==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+class Storage:
+    name = "base"
+
+    def __init__(self):
+        self.ops = Counter()
+
+    async def _op(self, op, coro):
+        self.ops[op] += 1
+        return await storage_metrics.measure(op, coro)
+
+    async def get_user(self, user_id):
+        return await self._op("get_user", self._get_user(str(user_id)))
+
+    async def set_user(self, user_id, data):
+        return await self._op("set_user", self._set_user(str(user_id), data))
+
+    async def update_users(self, items):
+        # items: (user_id, fields, append) — fields এর মান সরাসরি বসে, append এর আইটেমগুলো
+        # লিস্ট ফিল্ডের শেষে যোগ হয়; পুরো ডকুমেন্ট আবার লেখা হয় না
+        items = [(str(uid), fields, append) for uid, fields, append in items if fields or append]
+        if items:
+            return await self._op("update_users", self._update_users(items))
+
+    async def delete_user(self, user_id):
+        return await self._op("delete_user", self._delete_user(str(user_id)))
+
+    async def query_users(self, where=(), after=None, limit=300, order_by=None):
+        # where: (field, op, value) এর লিস্ট; ফলাফল (id, data), ইউজার আইডি অনুযায়ী সাজানো।
+        # order_by দিলে (ফিল্ড, id) অনুযায়ী সাজানো হয়, তখন after = (ফিল্ডের মান, id)
+        # এবং যে ডকুমেন্টে ফিল্ডটা নেই সেগুলো বাদ যায় (Firestore এর মতোই)
+        for _, op, _ in where:
+            if op not in QUERY_OPS:
+                raise ValueError(f"Unsupported query op: {op}")
+        return await self._op("query_users", self._query_users(list(where), after, limit, order_by))
+
+    async def iter_users(self, where=(), page_size=300, order_by=None):
+        after = None
+        while True:
+            page = await self.query_users(where, after, page_size, order_by)
+            for item in page:
+                yield item
+            if len(page) < page_size:
+                return
+            user_id, data = page[-1]
+            after = (data[order_by], user_id) if order_by else user_id
+
+    async def get_config(self):
+        return await self._op("get_config", self._get_config())
+
+    async def set_config(self, data):
+        return await self._op("set_config", self._set_config(data))
+
+    def watch_config(self, callback):
+        # ডিফল্ট: _version ফিল্ড দেখে পোলিং; callback(data, version) শুধু বদল হলেই ডাকা হয়।
+        # ফেরত দেয় একটা stop() ফাংশন
+        async def poll():
+            last = None
+            while True:
+                try:
+                    data = await self.get_config()
+                    if data is not None and data.get("_version") != last:
+                        last = data.get("_version")
+                        callback(data, last)
+                except Exception as e:
+                    logger.error(f"Config Poll Error: {e}")
+                await asyncio.sleep(CONFIG_POLL_INTERVAL)
+        task = asyncio.create_task(poll())
+        return task.cancel
+
+    async def get_stats(self):
+        return await self._op("get_stats", self._get_stats())
+
+    async def increment_stats(self, deltas):
+        return await self._op("increment_stats", self._increment_stats(deltas))
+
+    async def warm_up(self):
+        # স্টার্টআপে ক্লায়েন্ট আগেভাগে তৈরি করার জায়গা
         pass
 
+    async def close(self):
+        pass
+
+class FirestoreStorage(Storage):
+    name = "firestore"
+
+    async def warm_up(self):
+        # ভারী ইমপোর্ট আর ক্রেডেনশিয়াল লোড থ্রেডে হয়, event loop আটকে থাকে না
+        def load():
+            from firebase_admin import firestore, firestore_async
+            init_firebase()
+        await asyncio.get_running_loop().run_in_executor(executor, load)
+        get_async_db()
+
+    @property
+    def users_ref(self):
+        return get_db().collection("users")
+
+    @property
+    def settings_ref(self):
+        return get_db().collection("bot_settings").document("config")
+
+    @property
+    def stats_ref(self):
+        return get_db().collection("bot_stats").document("general")
+
+    async def _get_user(self, user_id):
+        doc = await async_firestore_get(self.users_ref.document(user_id))
+        return doc.to_dict() if doc.exists else None
+
+    async def _set_user(self, user_id, data):
+        await async_firestore_set(self.users_ref.document(user_id), data)
+
+    async def _update_users(self, items):
+        from firebase_admin import firestore
+        users_ref = self.users_ref
+        writes = []
+        for user_id, fields, append in items:
+            data = dict(fields)
+            for field, values in append.items():
+                data[field] = firestore.ArrayUnion(values)
+            writes.append((users_ref.document(user_id), data))
+        for i in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+            await async_firestore_batch(writes[i:i + FIRESTORE_BATCH_LIMIT])
+
+    async def _delete_user(self, user_id):
+        await async_firestore_delete(self.users_ref.document(user_id))
+
+    async def _query_users(self, where, after, limit, order_by):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        def build_query(client):
+            query = client.collection("users")
+            for field, op, value in where:
+                query = query.where(filter=FieldFilter(field, op, value))
+            if order_by:
+                query = query.order_by(order_by)
+            query = query.order_by("__name__").limit(limit)
+            if after is None:
+                return query
+            return query.start_after({order_by: after[0], "__name__": after[1]} if order_by else {"__name__": after})
+        docs = await async_firestore_query(build_query)
+        return [(doc.id, doc.to_dict()) for doc in docs]
+
+    async def _get_config(self):
+        doc = await async_firestore_get(self.settings_ref)
+        return doc.to_dict() if doc.exists else None
+
+    async def _set_config(self, data):
+        await async_firestore_set(self.settings_ref, data)
+
+    def watch_config(self, callback):
+        # Firestore নিজেই পরিবর্তন push করে; ভার্সন হিসেবে update_time ব্যবহার হয়
+        loop = asyncio.get_running_loop()
+
+        def on_snapshot(docs, changes, read_time):
+            for doc in docs:
+                if doc.exists:
+                    loop.call_soon_threadsafe(callback, doc.to_dict(), doc.update_time)
+
+        watch = self.settings_ref.on_snapshot(on_snapshot)
+        return watch.unsubscribe
+
+    async def _get_stats(self):
+        doc = await async_firestore_get(self.stats_ref)
+        return doc.to_dict() if doc.exists else {}
+
+    async def _increment_stats(self, deltas):
+        from firebase_admin import firestore
+        await async_firestore_set(self.stats_ref, {f: firestore.Increment(d) for f, d in deltas.items()})
+
+class SQLiteStorage(Storage):
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_PATH):
+        super().__init__()
+        self.path = path
+        self._conn = None
+        # একটাই কানেকশন, তাই সব কাজ একটা থ্রেডে ক্রমানুসারে চলে
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS docs (name TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _read(self, table, key_col, key):
+        row = self._connect().execute(f"SELECT data FROM {table} WHERE {key_col} = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _merge(self, table, key_col, key, data, increment=False, bump_version=False):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = self._read(table, key_col, key) or {}
+            for field, value in data.items():
+                current[field] = current.get(field, 0) + value if increment else value
+            if bump_version:
+                current["_version"] = current.get("_version", 0) + 1
+            conn.execute(f"INSERT OR REPLACE INTO {table} ({key_col}, data) VALUES (?, ?)", (key, json.dumps(current, ensure_ascii=False)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _apply_updates(self, items):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for user_id, fields, append in items:
+                current = self._read("users", "id", user_id) or {}
+                apply_user_update(current, fields, append)
+                conn.execute("INSERT OR REPLACE INTO users (id, data) VALUES (?, ?)", (user_id, json.dumps(current, ensure_ascii=False)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _select_users(self, where, after, limit, order_by):
+        sql = "SELECT id, data FROM users"
+        clauses, params = [], []
+        for field, op, value in where:
+            clauses.append(f"json_extract(data, ?) {op.replace('==', '=')} ?")
+            params += [f"$.{field}", int(value) if isinstance(value, bool) else value]
+        if order_by:
+            path = f"$.{order_by}"
+            clauses.append("json_extract(data, ?) IS NOT NULL")
+            params.append(path)
+            if after is not None:
+                clauses.append("(json_extract(data, ?) > ? OR (json_extract(data, ?) = ? AND id > ?))")
+                params += [path, after[0], path, after[0], after[1]]
+            sql += " WHERE " + " AND ".join(clauses) + " ORDER BY json_extract(data, ?), id LIMIT ?"
+            params += [path, limit]
+        else:
+            if after is not None:
+                clauses.append("id > ?")
+                params.append(after)
+            if clauses:
+                sql += " WHERE " + " AND ".join(clauses)
+            sql += " ORDER BY id LIMIT ?"
+            params.append(limit)
+        return [(uid, json.loads(data)) for uid, data in self._connect().execute(sql, params)]
+
+    async def _get_user(self, user_id):
+        return await self._run(self._read, "users", "id", user_id)
+
+    async def _set_user(self, user_id, data):
+        await self._run(self._merge, "users", "id", user_id, data)
+
+    async def _update_users(self, items):
+        await self._run(self._apply_updates, items)
+
+    async def _delete_user(self, user_id):
+        await self._run(lambda: self._connect().execute("DELETE FROM users WHERE id = ?", (user_id,)))
+
+    async def _query_users(self, where, after, limit, order_by):
+        return await self._run(self._select_users, where, after, limit, order_by)
+
+    async def _get_config(self):
+        return await self._run(self._read, "docs", "name", "config")
+
+    async def _set_config(self, data):
+        await self._run(self._merge, "docs", "name", "config", data, False, True)
+
+    async def _get_stats(self):
+        return await self._run(self._read, "docs", "name", "stats") or {}
+
+    async def _increment_stats(self, deltas):
+        await self._run(self._merge, "docs", "name", "stats", deltas, True)
+
+    async def close(self):
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+
+class MemoryStorage(Storage):
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self.users = {}
+        self.config = None
+        self.stats = {}
+
+    async def _get_user(self, user_id):
+        return copy.deepcopy(self.users.get(user_id))
+
+    async def _set_user(self, user_id, data):
+        self.users.setdefault(user_id, {}).update(copy.deepcopy(data))
+
+    async def _update_users(self, items):
+        for user_id, fields, append in items:
+            apply_user_update(self.users.setdefault(user_id, {}), copy.deepcopy(fields), copy.deepcopy(append))
+
+    async def _delete_user(self, user_id):
+        self.users.pop(user_id, None)
+
+    async def _query_users(self, where, after, limit, order_by):
+        if order_by:
+            keys = sorted((data[order_by], uid) for uid, data in self.users.items() if order_by in data)
+        else:
+            keys = sorted(self.users)
+        result = []
+        for key in keys:
+            if after is not None and key <= after:
+                continue
+            uid = key[1] if order_by else key
+            data = self.users[uid]
+            if all(field in data and QUERY_OPS[op](data[field], value) for field, op, value in where):
+                result.append((uid, copy.deepcopy(data)))
+                if len(result) >= limit:
+                    break
+        return result
+
+    async def _get_config(self):
+        return copy.deepcopy(self.config)
+
+    async def _set_config(self, data):
+        config = self.config or {}
+        self.config = {**config, **copy.deepcopy(data), "_version": config.get("_version", 0) + 1}
+
+    async def _get_stats(self):
+        return dict(self.stats)
+
+    async def _increment_stats(self, deltas):
+        for field, delta in deltas.items():
+            self.stats[field] = self.stats.get(field, 0) + delta
+
+def create_storage(backend=STORAGE_BACKEND):
+    if backend == "sqlite":
+        return SQLiteStorage()
+    if backend == "memory":
+        return MemoryStorage()
+    return FirestoreStorage()
+
+storage = create_storage()
+
+# --- HTTP SERVER (ASYNC) ---
+# Flask থ্রেডের বদলে বটের নিজের event loop এই একটাই ছোট HTTP সার্ভার চলে:
+# হেলথ চেক, webhook আর অ্যাডমিন রুট সব এখানেই
+PORT = int(os.environ.get("PORT", 10000))
+HTTP_MAX_BODY = 1024 * 1024
+HTTP_KEEPALIVE_TIMEOUT = 15
+HTTP_REQUEST_TIMEOUT = 10  # প্রথম লাইন আসার পর হেডার আর বডি মিলিয়ে পুরো রিকোয়েস্টের সীমা (slowloris ঠেকাতে)
+HTTP_MAX_HEADERS = 100
+HTTP_DRAIN_TIMEOUT = 10
+
+class HttpRequest:
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+class HttpResponse:
+    # body bytes/str হলে Content-Length সহ, async iterator হলে chunked এ স্ট্রিম হয়
+    def __init__(self, body=b"", status=200, content_type="text/plain; charset=utf-8", headers=None):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or {}
+
+class AsyncHttpServer:
+    def __init__(self, host="0.0.0.0", port=PORT):
+        self.host = host
+        self.port = port
+        self.routes = {}  # (method, path) -> async handler(request) -> HttpResponse
+        self._server = None
+        self._conns = set()
+
+    def route(self, method, path):
+        def decorator(func):
+            self.routes[(method, path)] = func
+            return func
+        return decorator
+
+    async def _read_request(self, reader):
+        line = await asyncio.wait_for(reader.readline(), timeout=HTTP_KEEPALIVE_TIMEOUT)
+        if not line:
+            return None
+        return await asyncio.wait_for(self._read_rest(reader, line), timeout=HTTP_REQUEST_TIMEOUT)
+
+    async def _read_rest(self, reader, line):
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        for _ in range(HTTP_MAX_HEADERS + 1):
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = h.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        else:
+            raise ValueError("too many headers")
+        length = int(headers.get("content-length") or 0)
+        if length > HTTP_MAX_BODY:
+            raise ValueError("body too large")
+        body = await reader.readexactly(length) if length else b""
+        path, _, qs = target.partition("?")
+        return HttpRequest(method, path, dict(urllib.parse.parse_qsl(qs)), headers, body)
+
+    async def _dispatch(self, request):
+        handler = self.routes.get((request.method, request.path))
+        if handler is None and request.method == "HEAD":
+            # Flask এর মতো প্রতিটি GET রাউট HEAD এও উত্তর দেয় (হেলথ চেক)
+            handler = self.routes.get(("GET", request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                return HttpResponse("Method Not Allowed", status=405)
+            return HttpResponse("Not Found", status=404)
+        try:
+            return await handler(request)
+        except Exception as e:
+            logger.error(f"HTTP Handler Error ({request.path}): {e}")
+            return HttpResponse("Internal Server Error", status=500)
+
+    async def _write(self, writer, response, keep_alive, head_only=False):
+        streaming = not isinstance(response.body, bytes)
+        head = [f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}",
+                f"Content-Type: {response.content_type}",
+                "Transfer-Encoding: chunked" if streaming else f"Content-Length: {len(response.body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{k}: {v}" for k, v in response.headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        if head_only:
+            if streaming:
+                await response.body.aclose()
+            await writer.drain()
+            return True
+        if not streaming:
+            writer.write(response.body)
+            await writer.drain()
+            return True
+        try:
+            async for chunk in response.body:
+                if chunk:
+                    writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+                    await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # হেডার চলে গেছে, তাই শেষ চাংক (0) না পাঠিয়ে কানেকশন বন্ধ করা হয়; ক্লায়েন্ট বুঝবে বডি অসম্পূর্ণ
+            logger.error(f"HTTP Stream Error: {e}")
+            return False
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        return True
+
+    async def _handle_conn(self, reader, writer):
+        task = asyncio.current_task()
+        self._conns.add(task)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (ValueError, UnicodeDecodeError):
+                    await self._write(writer, HttpResponse("Bad Request", status=400), False)
+                    break
+                if request is None:
+                    break
+                keep_alive = request.headers.get("connection", "").lower() != "close" and self._server.is_serving()
+                complete = await self._write(writer, await self._dispatch(request), keep_alive, request.method == "HEAD")
+                if not complete or not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._conns.discard(task)
+            writer.close()
+
+    async def start(self):
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle_conn, self.host, self.port)
+            logger.info(f"HTTP server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        # নতুন কানেকশন বন্ধ, চলমান রিকোয়েস্টগুলো শেষ হওয়ার জন্য কিছুক্ষণ অপেক্ষা
+        if self._server is None:
+            return
+        self._server.close()
+        if self._conns:
+            _, pending = await asyncio.wait(set(self._conns), timeout=HTTP_DRAIN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+        await self._server.wait_closed()
+        self._server = None
+
+http_server = AsyncHttpServer()
+
+@http_server.route("GET", "/")
+async def home(request):
+    return HttpResponse("Skyzone IT Bot High-Performance Mode is ON!")
+
 # --- LOGGING ---
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -148,58 +851,736 @@ QUESTIONS = [
     {"id": 10, "q": "🔟 আপনি কীভাবে মার্কেটিং করতে চান? (সংক্ষেপে)", "a": ["Facebook e post kore", "ফেসবুক মার্কেটিং করে", "ফেসবুক মার্কেটিং করে বিভিন্ন গ্রুপে পোস্ট করে", "ফেসবুক গ্রুপে পোস্ট করে", "userder sathe contect kore", "social media", "marketing kore"], "threshold": 50}
 ]
 
+DEFAULT_GROUP_KEYWORDS = [
+    "it", "হ্যালো", "hello", "hi", "হাই", "কি কাজ", "কাজ কি", "কাজ কী",
+    "kaj ki", "ki kaj", "আমি কাজ করতে চাই", "ami kaj korte chai",
+    "কাজ চাই", "আমি নতুন", "ami notun", "i am new", "ami new",
+    "আমি গ্রুপের নতুন মেম্বার", "ami group e number", "ami group e notun",
+    "কিভাবে কাজ করব", "help me", "টাকা ইনকাম", "income",
+    "কাজ শিখব", "ভাই কাজ আছে", "kaj ache", "kaj hobe", "work"
+]
+
+# --- ANSWER GRADER ---
+# বাংলা অঙ্ক ইংরেজিতে (৫০ -> 50), যতিচিহ্ন/ইমোজি বাদ, আর অতিরিক্ত স্পেস এক করা হয়
+BENGALI_DIGITS = str.maketrans("০১২৩৪৫৬৭৮৯", "0123456789")
+PUNCT_RE = re.compile(r"[^\w\s\u0980-\u09FF]+")
+
+def normalize_answer(text):
+    text = PUNCT_RE.sub(" ", text.translate(BENGALI_DIGITS).lower())
+    return " ".join(text.split())
+
+class AnswerGrader:
+    # উত্তরগুলো একবারই normalize করে রাখা হয়, প্রতি চেষ্টায় এক কলেই স্কোর বের হয়
+    def __init__(self, questions):
+        self.questions = questions
+        self.thresholds = [q['threshold'] for q in questions]
+        self._index_by_id = {q['id']: i for i, q in enumerate(questions)}
+        self._choices = None
+        self._process = self._scorer = None
+
+    def warm_up(self):
+        # rapidfuzz ইমপোর্ট আর উত্তর normalize প্রথম ব্যবহারে হয় (post_init এর warm-up এ আগেই সেরে রাখা হয়)
+        if self._choices is None:
+            from rapidfuzz import process
+            from rapidfuzz.fuzz import token_set_ratio
+            self._process, self._scorer = process, token_set_ratio
+            self._choices = [list(dict.fromkeys(normalize_answer(a) for a in q['a'])) for q in self.questions]
+        return self._choices
+
+    def score(self, idx, answer, cutoff=0):
+        choices = self._choices or self.warm_up()
+        match = self._process.extractOne(normalize_answer(answer), choices[idx], scorer=self._scorer, processor=None, score_cutoff=cutoff)
+        return match[1] if match else 0.0
+
+    def similarity(self, answer, target_norm):
+        self.warm_up()
+        return self._scorer(normalize_answer(answer), target_norm)
+
+    def grade(self, idx, answer):
+        threshold = self.thresholds[idx]
+        return self.score(idx, answer, threshold) >= threshold
+
+    def score_batch(self, idx, answers):
+        choices = self.warm_up()[idx]
+        queries = [normalize_answer(a) for a in answers]
+        try:
+            # অনেক উত্তর একসাথে হলে cdist সব কোরে চালায় (numpy লাগে)
+            return self._process.cdist(queries, choices, scorer=self._scorer, processor=None, workers=-1).max(axis=1).tolist()
+        except ImportError:
+            return [self._process.extractOne(q, choices, scorer=self._scorer, processor=None)[1] for q in queries]
+
+    def regrade(self, records, thresholds=None):
+        # records: (question id, answer) জোড়া; thresholds: {question id: নতুন threshold}
+        # লগ করা উত্তরগুলো নতুন threshold দিয়ে আবার যাচাই করে প্রতি প্রশ্নের পাসের হার দেয়
+        thresholds = thresholds or {}
+        grouped = defaultdict(list)
+        for qid, answer in records:
+            if qid in self._index_by_id:
+                grouped[qid].append(answer)
+        report = {}
+        for qid, answers in grouped.items():
+            idx = self._index_by_id[qid]
+            threshold = thresholds.get(qid, self.thresholds[idx])
+            scores = self.score_batch(idx, answers)
+            passed = sum(1 for sc in scores if sc >= threshold)
+            report[qid] = {"threshold": threshold, "total": len(scores), "passed": passed, "pass_rate": passed / len(scores), "scores": scores}
+        return report
+
+grader = AnswerGrader(QUESTIONS)
+FINAL_PHRASE_NORM = normalize_answer(STATIC_CONFIG['final_phrase'])
+
+# --- GROUP KEYWORD MATCHER ---
+def is_word_char(ch):
+    # বাংলা কার-চিহ্ন (Mn/Mc) শব্দেরই অংশ, তাই এগুলোকেও word character ধরা হয়
+    return ch.isalnum() or ch == "_" or unicodedata.category(ch) in ("Mn", "Mc")
+
+def normalize_spaces(text):
+    return " ".join(text.lower().split())
+
+class KeywordMatcher:
+    # Aho-Corasick: একবার বিল্ড হয়, তারপর এক পাসেই সব কিওয়ার্ড খোঁজা যায়
+    def __init__(self, keywords):
+        self.keywords = tuple(dict.fromkeys(k for k in (normalize_spaces(k) for k in keywords) if k))
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for kw in self.keywords:
+            node = 0
+            for ch in kw:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (kw,)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def search(self, text):
+        text = normalize_spaces(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        last = len(text) - 1
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for kw in out[node]:
+                start = i - len(kw) + 1
+                if (start == 0 or not is_word_char(text[start - 1])) and (i == last or not is_word_char(text[i + 1])):
+                    return kw
+        return None
+
+group_matcher = KeywordMatcher(DEFAULT_GROUP_KEYWORDS)
+
+def refresh_group_matcher():
+    global group_matcher
+    keywords = GLOBAL_CONFIG.get("group_keywords") or DEFAULT_GROUP_KEYWORDS
+    if tuple(dict.fromkeys(normalize_spaces(k) for k in keywords)) != group_matcher.keywords:
+        group_matcher = KeywordMatcher(keywords)
+        logger.info(f"Group keywords reloaded ({len(group_matcher.keywords)})")
+
 # --- CACHE MANAGER ---
-async def load_config_to_cache():
+_config_unwatch = None
+
+def apply_config(data, version=None, force=False):
     global GLOBAL_CONFIG
+    if not force and version is not None and version == GLOBAL_CONFIG.version:
+        return
+    merged = {**DEFAULT_CONFIG, **{k: v for k, v in data.items() if not k.startswith("_")}}
+    GLOBAL_CONFIG = ConfigSnapshot(merged, version)
+    refresh_group_matcher()
+
+async def load_config_to_cache():
     try:
-        doc = await async_firestore_get(settings_ref)
-        if doc.exists:
-            data = doc.to_dict()
-            GLOBAL_CONFIG.update(data)
+        data = await storage.get_config()
+        if data is not None:
+            apply_config(data, data.get("_version"))
             logger.info("Config loaded to RAM")
         else:
-            await async_firestore_set(settings_ref, GLOBAL_CONFIG)
+            await storage.set_config(dict(GLOBAL_CONFIG.data))
     except Exception as e:
         logger.error(f"Config Load Error: {e}")
 
 async def update_config_cache(key, value):
-    global GLOBAL_CONFIG
-    GLOBAL_CONFIG[key] = value
-    await async_firestore_set(settings_ref, {key: value}, merge=True)
+    # এই ইনস্ট্যান্সে সাথে সাথে, অন্য ইনস্ট্যান্সে listener/poll এর মাধ্যমে পৌঁছায়
+    apply_config({**GLOBAL_CONFIG.data, key: value}, GLOBAL_CONFIG.version, force=True)
+    await storage.set_config({key: value})
+
+def start_config_sync():
+    global _config_unwatch
+    if _config_unwatch is None:
+        try:
+            _config_unwatch = storage.watch_config(on_config_change)
+        except Exception as e:
+            logger.error(f"Config Watch Error: {e}")
+
+def stop_config_sync():
+    global _config_unwatch
+    if _config_unwatch is not None:
+        _config_unwatch()
+        _config_unwatch = None
+
+def on_config_change(data, version):
+    try:
+        apply_config(data, version)
+        logger.info(f"Config updated (version {version})")
+    except Exception as e:
+        logger.error(f"Config Apply Error: {e}")
+
+# --- BACKGROUND FLUSHER ---
+class BackgroundFlusher(abc.ABC):
+    # জমে থাকা রাইটগুলো নির্দিষ্ট সময় পরপর (অথবা wake() ডাকলে সাথে সাথে) ফ্লাশ করে
+    name = "Flush"
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flush_task = None
+
+    @property
+    def running(self):
+        return self._flush_task is not None
+
+    def wake(self):
+        self._wakeup.set()
+
+    @abc.abstractmethod
+    async def flush(self):
+        ...
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"{self.name} Loop Error: {e}")
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task is not None:
+            # চলমান ফ্লাশ শেষ হওয়া পর্যন্ত অপেক্ষা; লুপটা শুধু অপেক্ষার অবস্থায় থাকলে cancel হয়
+            async with self._flush_lock:
+                self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
 
 # --- STATS HELPERS ---
+# প্রতিটি increment এ আলাদা Firestore রাইটের বদলে RAM এ ডেল্টা জমিয়ে একসাথে লেখা হয়
+STATS_FLUSH_INTERVAL = float(os.environ.get("STATS_FLUSH_INTERVAL", 10))
+STATS_FLUSH_EVENTS = int(os.environ.get("STATS_FLUSH_EVENTS", 50))
+STATS_REFRESH_INTERVAL = float(os.environ.get("STATS_REFRESH_INTERVAL", 60))
+
+class StatsAggregator(BackgroundFlusher):
+    name = "Stats Flush"
+
+    def __init__(self, flush_interval=STATS_FLUSH_INTERVAL, flush_events=STATS_FLUSH_EVENTS, refresh_interval=STATS_REFRESH_INTERVAL):
+        super().__init__(flush_interval)
+        self.flush_events = flush_events
+        self.refresh_interval = refresh_interval
+        self._pending = defaultdict(int)
+        self._inflight = {}
+        self._events = 0
+        self._persisted = None
+        self._loaded_at = 0.0
+
+    def increment(self, field, amount=1):
+        self.increment_many({field: amount})
+
+    def increment_many(self, deltas):
+        # একই ঘটনার কয়েকটা কাউন্টার একসাথে, ফ্লাশের হিসাবে একটাই ইভেন্ট
+        for field, amount in deltas.items():
+            self._pending[field] += amount
+        self._events += 1
+        if self._events >= self.flush_events:
+            self.wake()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._inflight, self._pending = dict(self._pending), defaultdict(int)
+            self._events = 0
+            try:
+                await storage.increment_stats(self._inflight)
+            except asyncio.CancelledError:
+                # মাঝপথে cancel হলে ডেল্টা হারানোর চেয়ে (খুব কম ক্ষেত্রে) দুবার গোনা ভালো
+                for f, d in self._inflight.items():
+                    self._pending[f] += d
+                raise
+            except Exception as e:
+                logger.error(f"Stats Flush Error: {e}")
+                for f, d in self._inflight.items():
+                    self._pending[f] += d
+            else:
+                if self._persisted is not None:
+                    for f, d in self._inflight.items():
+                        self._persisted[f] = self._persisted.get(f, 0) + d
+            finally:
+                self._inflight = {}
+
+    async def _refresh(self):
+        try:
+            self._persisted = await storage.get_stats()
+            self._loaded_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Stats Load Error: {e}")
+
+    async def snapshot(self):
+        # অন্য ইনস্ট্যান্সের রাইট ধরতে মাঝে মাঝে Firestore থেকে রিফ্রেশ করা হয়
+        if self._persisted is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+            async with self._flush_lock:
+                await self._refresh()
+        merged = dict(self._persisted or {})
+        for pending in (self._inflight, self._pending):
+            for f, d in pending.items():
+                merged[f] = merged.get(f, 0) + d
+        return merged
+
+stats = StatsAggregator()
+
 async def increment_stat(field):
-    try:
-        loop = asyncio.get_running_loop()
-        loop.run_in_executor(executor, lambda: stats_ref.set({field: firestore.Increment(1)}, merge=True))
-    except:
-        pass
+    stats.increment(field)
+    if not stats.running:
+        await stats.flush()
 
 async def get_stats_safe():
     try:
-        doc = await async_firestore_get(stats_ref)
-        if doc.exists:
-            return doc.to_dict()
-    except:
-        pass
+        return await stats.snapshot()
+    except Exception as e:
+        logger.error(f"Stats Error: {e}")
     return {}
 
+# --- FUNNEL ANALYTICS ---
+# ইউজার ডকুমেন্ট স্ক্যান না করে, ঘটনার সময়েই StatsAggregator এ কাউন্টার বাড়ানো হয়।
+# ফিল্ডগুলো stats ডকুমেন্টে ফ্ল্যাট নামে থাকে:
+#   q{id}_attempts, q{id}_failures  (প্রতিটি চেষ্টা)
+#   q{id}_scored, q{id}_near, q{id}_score_sum, q{id}_score_{0..9}  (নমুনা: প্রতি N তম চেষ্টার পুরো স্কোর, ১০ করে ভাগ)
+#   fn_{আগের state}_to_{নতুন state}  (lowercase)
+#   ttp_le_{m}m, ttp_gt_{m}m  (ইন্টারভিউ শুরু থেকে পাস পর্যন্ত মিনিট)
+FUNNEL_STATES = ["IDLE", "READY_CHECK", "INTERVIEW", "TERMS", "WAITING_PHRASE", "PASSED"]
+TIME_TO_PASS_BUCKETS = [2, 5, 10, 20, 30, 60, 120]  # মিনিট
+NEAR_MISS_MARGIN = 10  # threshold এর এত কাছের ভুল উত্তর "near miss"
+ANSWER_SCORE_SAMPLE_EVERY = int(os.environ.get("ANSWER_SCORE_SAMPLE_EVERY", 4))
+_answer_attempts = Counter()
+
+def record_answer(idx, answer, passed):
+    # পাস/ফেল grade() এর cutoff পথ থেকেই আসে; cutoff ছাড়া পুরো স্কোর শুধু প্রতি N তম চেষ্টায় হিসাব হয়
+    qid = QUESTIONS[idx]['id']
+    deltas = {f"q{qid}_attempts": 1}
+    if not passed:
+        deltas[f"q{qid}_failures"] = 1
+    _answer_attempts[qid] += 1
+    if _answer_attempts[qid] % ANSWER_SCORE_SAMPLE_EVERY == 0:
+        score = grader.score(idx, answer)
+        deltas.update({f"q{qid}_scored": 1, f"q{qid}_score_sum": round(score), f"q{qid}_score_{min(int(score) // 10, 9)}": 1})
+        if not passed and score >= grader.thresholds[idx] - NEAR_MISS_MARGIN:
+            deltas[f"q{qid}_near"] = 1
+    stats.increment_many(deltas)
+
+def move_state(user_data, state):
+    old = user_data.get("state") or "IDLE"
+    user_data["state"] = state
+    if old != state:
+        stats.increment(f"fn_{old.lower()}_to_{state.lower()}")
+
+def record_time_to_pass(user_data):
+    started = user_data.get("started_at")
+    if not started:
+        return
+    minutes = (time.time() - started) / 60
+    bucket = next((f"ttp_le_{m}m" for m in TIME_TO_PASS_BUCKETS if minutes <= m), f"ttp_gt_{TIME_TO_PASS_BUCKETS[-1]}m")
+    stats.increment(bucket)
+
+def render_funnel_stats(data):
+    # admin_stats প্যানেলের জন্য: প্রতিটি state এ কতজন ঢুকেছে, প্রশ্নভিত্তিক ভুলের হার আর পাসের সময়
+    entered = Counter()
+    for field, count in data.items():
+        if field.startswith("fn_"):
+            entered[field.partition("_to_")[2].upper()] += count
+    lines = ["🔻 Funnel: " + " → ".join(f"{state.lower().replace('_', ' ')} {entered.get(state, 0)}" for state in FUNNEL_STATES[1:])]
+    # প্যানেলটা Markdown এ যায়, তাই এখানে * _ ` এর মতো চিহ্ন রাখা যাবে না
+    lines.append("❓ প্রশ্ন (চেষ্টা / ভুল% / near miss (নমুনা) / গড় স্কোর (নমুনা) / threshold):")
+    for idx, q in enumerate(QUESTIONS):
+        key = f"q{q['id']}"
+        attempts = data.get(f"{key}_attempts", 0)
+        if not attempts:
+            continue
+        failures = data.get(f"{key}_failures", 0)
+        near = data.get(f"{key}_near", 0)
+        scored = data.get(f"{key}_scored", 0)
+        mean = f"{data.get(f'{key}_score_sum', 0) / scored:.0f}" if scored else "-"
+        lines.append(f"Q{q['id']}: {attempts} / {failures * 100 // attempts}% / {near} / {mean} / {grader.thresholds[idx]}")
+    buckets = [(f"≤{m}m", data.get(f"ttp_le_{m}m", 0)) for m in TIME_TO_PASS_BUCKETS]
+    buckets.append((f">{TIME_TO_PASS_BUCKETS[-1]}m", data.get(f"ttp_gt_{TIME_TO_PASS_BUCKETS[-1]}m", 0)))
+    if any(count for _, count in buckets):
+        lines.append("⏱ পাসের সময়: " + ", ".join(f"{label} {count}" for label, count in buckets if count))
+    return "\n".join(lines) + "\n"
+
+# --- USER STATE CACHE (WRITE-BEHIND) ---
+# প্রতিটি মেসেজে Firestore থেকে পড়ার বদলে RAM থেকে ইউজার স্টেট দেওয়া হয়,
+# আর রাইটগুলো জমিয়ে ব্যাকগ্রাউন্ডে একসাথে ফ্লাশ করা হয়।
+# ক্যাশ প্রতি প্রসেসে আলাদা। একাধিক ইনস্ট্যান্স (load balancer এর পেছনে webhook) চালালে একই ইউজারের
+# পরপর আপডেট ভিন্ন ইনস্ট্যান্সে গিয়ে পুরনো স্টেট পড়তে পারে, তাই MULTI_INSTANCE=1 দিলে ক্যাশ বন্ধ থাকে:
+# প্রতিটি get স্টোরেজ থেকে পড়ে আর প্রতিটি set সাথে সাথে লেখা হয়। তখনও এক ইউজারের দুটো আপডেট একই সময়ে
+# দুই ইনস্ট্যান্সে চললে শেষ রাইটটাই থাকে (per-user ক্রম শুধু এক প্রসেসের ভেতরে), তাই পারলে একটাই ইনস্ট্যান্স রাখুন
+MULTI_INSTANCE = os.environ.get("MULTI_INSTANCE") == "1"
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 5000))
+USER_CACHE_TTL = 0 if MULTI_INSTANCE else float(os.environ.get("USER_CACHE_TTL", 1800))
+USER_FLUSH_INTERVAL = float(os.environ.get("USER_FLUSH_INTERVAL", 2))
+USER_FLUSH_BATCH = int(os.environ.get("USER_FLUSH_BATCH", 200))
+
+# ইউজার ডকুমেন্ট (schema 2): answers এ প্রশ্নের পুরো লেখা না রেখে শুধু
+# {"qid": প্রশ্নের id, "a": উত্তর, "ts": সময়} রাখা হয়। পুরনো ডকুমেন্ট migrate_users.py দিয়ে বদলানো যায়
+USER_SCHEMA = 2
+
+def default_user_data():
+    return {"state": "IDLE", "q_index": 0, "answers": [], "passed": False, "schema": USER_SCHEMA}
+
+def user_delta(old, new):
+    # আগের আর নতুন ডাটা তুলনা করে শুধু বদলানো ফিল্ড (fields) আর লিস্টে নতুন যোগ হওয়া আইটেম (append)
+    if old is None:
+        return dict(new), {}
+    fields, append = {}, {}
+    for key, value in new.items():
+        prev = old.get(key)
+        if key in old and prev == value:
+            continue
+        if isinstance(value, list) and isinstance(prev, list) and len(value) > len(prev) and value[:len(prev)] == prev:
+            append[key] = value[len(prev):]
+        else:
+            fields[key] = value
+    return fields, append
+
+def merge_delta(older, newer):
+    fields = {**older[0], **newer[0]}
+    append = {key: list(items) for key, items in older[1].items() if key not in newer[0]}
+    for key, items in newer[1].items():
+        if key in fields:
+            fields[key] = fields[key] + items
+        else:
+            append[key] = append.get(key, []) + items
+    return fields, append
+
+class UserStateCache(BackgroundFlusher):
+    name = "User Flush"
+
+    def __init__(self, max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL, flush_interval=USER_FLUSH_INTERVAL, flush_batch=USER_FLUSH_BATCH):
+        super().__init__(flush_interval)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_batch = flush_batch
+        self._entries = OrderedDict()  # user_id -> (data, expires_at), LRU order
+        self._dirty = {}  # user_id -> (full data, (fields, append) delta waiting to be written)
+        self._inflight = {}  # ফ্লাশ চলাকালীন যে রাইটগুলো স্টোরেজে যাচ্ছে, কমিট না হওয়া পর্যন্ত পড়া যায়
+        self._unsaved = set()  # স্টোরেজে এখনো ডকুমেন্ট নেই, প্রথম রাইটে পুরো ডাটা যাবে
+
+    def _put(self, user_id, data):
+        self._entries[user_id] = (data, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            # dirty কপি _dirty/_inflight এ থাকে, তাই evict করলে ডাটা হারায় না
+            evicted, _ = self._entries.popitem(last=False)
+            self._unsaved.discard(evicted)
+
+    def _lookup(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry:
+            data, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(user_id)
+                return data
+            del self._entries[user_id]
+            self._unsaved.discard(user_id)
+        pending = self._dirty.get(user_id) or self._inflight.get(user_id)
+        if pending is None:
+            return None
+        self._put(user_id, pending[0])
+        return pending[0]
+
+    async def get(self, user_id):
+        user_id = str(user_id)
+        data = self._lookup(user_id)
+        if data is None:
+            try:
+                data = await storage.get_user(user_id)
+            except Exception as e:
+                logger.error(f"User Load Error ({user_id}): {e}")
+                return default_user_data()
+            # লোড চলাকালীন নতুন রাইট এসে থাকলে সেটাই সঠিক
+            current = self._lookup(user_id)
+            if current is None:
+                if data is None:
+                    data = default_user_data()
+                    self._unsaved.add(user_id)
+                self._put(user_id, data)
+            else:
+                data = current
+        return copy.deepcopy(data)
+
+    async def set(self, user_id, data):
+        user_id = str(user_id)
+        data = copy.deepcopy(data)
+        base = self._lookup(user_id)
+        if user_id in self._unsaved:
+            self._unsaved.discard(user_id)
+            base = None
+        delta = user_delta(base, {k: v for k, v in data.items() if k != "updated_at"})
+        if not delta[0] and not delta[1]:
+            self._put(user_id, data)
+            return
+        # ইনক্রিমেন্টাল এক্সপোর্টের জন্য শেষ পরিবর্তনের সময়
+        data["updated_at"] = delta[0]["updated_at"] = int(time.time())
+        self._put(user_id, data)
+        if not self.running:
+            # ব্যাকগ্রাউন্ড ফ্লাশার চালু না থাকলে সরাসরি লিখে দেওয়া হয়
+            await storage.update_users([(user_id, *delta)])
+            return
+        pending = self._dirty.get(user_id)
+        self._dirty[user_id] = (data, merge_delta(pending[1], delta) if pending else delta)
+        if len(self._dirty) >= self.flush_batch:
+            self.wake()
+
+    async def delete(self, user_id):
+        user_id = str(user_id)
+        async with self._flush_lock:
+            self._entries.pop(user_id, None)
+            self._dirty.pop(user_id, None)
+            self._unsaved.discard(user_id)
+            await storage.delete_user(user_id)
+
+    def count_by_state(self):
+        # ক্যাশে থাকা (সাম্প্রতিক সক্রিয়) ইউজাররা কোন state এ আছে; মেয়াদ শেষ হওয়া এন্ট্রি বাদ
+        now = time.monotonic()
+        return Counter(data.get("state", "IDLE") for data, expires_at in self._entries.values() if expires_at > now)
+
+    def _restore(self, pending):
+        # এর মধ্যে আসা নতুন রাইটগুলো পুরনো delta র উপরে বসে
+        for uid, (data, delta) in pending.items():
+            newer = self._dirty.get(uid)
+            self._dirty[uid] = (newer[0], merge_delta(delta, newer[1])) if newer else (data, delta)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            pending = self._inflight = self._dirty
+            self._dirty = {}
+            try:
+                await storage.update_users([(uid, *delta) for uid, (_, delta) in pending.items()])
+            except asyncio.CancelledError:
+                # রাইট হয়েছে কিনা জানা নেই, আবার লেখা নিরাপদ (ফিল্ড সেট আর ArrayUnion দুটোই idempotent)
+                self._restore(pending)
+                raise
+            except Exception as e:
+                logger.error(f"User Flush Error: {len(pending)} writes failed, will retry: {e}")
+                self._restore(pending)
+            finally:
+                self._inflight = {}
+
+user_cache = UserStateCache()
+
 # --- USER DATA HELPERS ---
 async def get_user_data(user_id):
-    try:
-        doc = await async_firestore_get(users_ref.document(str(user_id)))
-        if doc.exists:
-            return doc.to_dict()
-    except:
-        pass
-    return {"state": "IDLE", "q_index": 0, "answers": [], "passed": False}
+    return await user_cache.get(user_id)
 
 async def update_user_data(user_id, data):
-    await async_firestore_set(users_ref.document(str(user_id)), data)
+    await user_cache.set(user_id, data)
 
 async def delete_user_data(user_id):
-    loop = asyncio.get_running_loop()
-    await loop.run_in_executor(executor, lambda: users_ref.document(str(user_id)).delete())
+    await user_cache.delete(user_id)
+
+# --- CHAT ADMIN CACHE ---
+# প্রতি গ্রুপ মেসেজে get_chat_member কল না করে, গ্রুপের অ্যাডমিন লিস্ট RAM এ রাখা হয়
+ADMIN_CACHE_TTL = float(os.environ.get("ADMIN_CACHE_TTL", 600))
+ADMIN_CACHE_RETRY = 60
+ADMIN_STATUSES = ('creator', 'administrator')
+
+class ChatAdminCache:
+    def __init__(self, ttl=ADMIN_CACHE_TTL):
+        self.ttl = ttl
+        self._admins = {}  # chat_id -> (set of admin user ids, expires_at)
+        self._loading = {}  # chat_id -> running refresh task
+
+    async def _fetch(self, bot, chat_id):
+        try:
+            members = await bot.get_chat_administrators(chat_id)
+            self._admins[chat_id] = ({m.user.id for m in members}, time.monotonic() + self.ttl)
+        except Exception as e:
+            logger.error(f"Admin List Error ({chat_id}): {e}")
+            # পুরনো লিস্ট থাকলে সেটাই রাখা হয়, আর কিছুক্ষণ পর আবার চেষ্টা
+            admins = self._admins.get(chat_id, (set(), 0))[0]
+            self._admins[chat_id] = (admins, time.monotonic() + ADMIN_CACHE_RETRY)
+        finally:
+            self._loading.pop(chat_id, None)
+
+    def _refresh(self, bot, chat_id):
+        task = self._loading.get(chat_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(bot, chat_id))
+            self._loading[chat_id] = task
+        return task
+
+    async def is_admin(self, bot, chat_id, user_id):
+        entry = self._admins.get(chat_id)
+        if entry is None:
+            # টাস্কটা সবার মধ্যে শেয়ার করা, তাই একজন অপেক্ষাকারী বাতিল হলে অন্যদের লোড যেন বাতিল না হয়
+            await asyncio.shield(self._refresh(bot, chat_id))
+            entry = self._admins[chat_id]
+        elif entry[1] <= time.monotonic():
+            # মেয়াদ শেষ হলে পুরনো লিস্ট দিয়েই উত্তর, রিফ্রেশ চলে ব্যাকগ্রাউন্ডে
+            self._refresh(bot, chat_id)
+        return user_id in entry[0]
+
+    async def prefetch(self, bot, chat_ids):
+        await asyncio.gather(*(asyncio.shield(self._refresh(bot, chat_id)) for chat_id in chat_ids if chat_id not in self._admins))
+
+    def apply_member_update(self, chat_id, user_id, status):
+        entry = self._admins.get(chat_id)
+        if entry is None:
+            return
+        if status in ADMIN_STATUSES:
+            entry[0].add(user_id)
+        else:
+            entry[0].discard(user_id)
+
+chat_admins = ChatAdminCache()
+
+# --- GROUP REPLY COALESCER ---
+# গ্রুপে একসাথে অনেক নতুন ইউজার "hi"/"kaj ki" লিখলে প্রত্যেককে আলাদা রিপ্লাই না দিয়ে,
+# কিছুক্ষণ (window) অপেক্ষা করে সবাইকে মেনশন করে একটাই মেসেজ পাঠানো হয়।
+# একবার স্বাগত জানানো ইউজারকে GROUP_GREETED_TTL পর্যন্ত আর রিপ্লাই দেওয়া হয় না।
+GROUP_REPLY_WINDOW = float(os.environ.get("GROUP_REPLY_WINDOW", 5))  # কনফিগে "group_reply_window" দিয়েও বদলানো যায়
+GROUP_REPLY_MAX_MENTIONS = 30
+GROUP_GREETED_TTL = float(os.environ.get("GROUP_GREETED_TTL", 6 * 3600))
+GROUP_GREETED_MAX = int(os.environ.get("GROUP_GREETED_MAX", 50000))
+
+class ExpiringSet:
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._expiry = OrderedDict()  # key -> expires_at, পুরনোগুলো সামনে
+
+    def __contains__(self, key):
+        expires = self._expiry.get(key)
+        if expires is None:
+            return False
+        if expires <= time.monotonic():
+            del self._expiry[key]
+            return False
+        return True
+
+    def add(self, key):
+        now = time.monotonic()
+        self._expiry.pop(key, None)
+        self._expiry[key] = now + self.ttl
+        while self._expiry:
+            oldest, expires = next(iter(self._expiry.items()))
+            if expires > now and len(self._expiry) <= self.max_size:
+                break
+            del self._expiry[oldest]
+
+    def __len__(self):
+        return len(self._expiry)
+
+def group_welcome_text(mentions):
+    video_link = GLOBAL_CONFIG.get("video_link", "https://t.me/skyzoneit/6300")
+    you = "আপনি" if len(mentions) == 1 else "আপনারা"
+    return (
+        f"আসসালামু আলাইকুম {', '.join(mentions)}!\n\n"
+        f"যেহেতু {you} আমাদের এখানে নতুন। তাই ভিডিওটি দেখুন। "
+        f"এই ভিডিওটি দেখে {you} কাজ শিখুন এবং কি করতে হবে বুঝে যাবেন।\n\n"
+        f"🎥 <b>কাজের ভিডিও লিংক:</b>\n{video_link}"
+    )
+
+class GroupReplyCoalescer:
+    def __init__(self, window=None):
+        self.window = window
+        self.greeted = ExpiringSet(GROUP_GREETED_TTL, GROUP_GREETED_MAX)
+        self._pending = {}  # chat_id -> (bot, প্রথম মেসেজের id, {user_id: mention})
+        self._timers = {}
+        self.sent = 0
+        self.coalesced = 0
+
+    def current_window(self):
+        if self.window is not None:
+            return self.window
+        try:
+            return float(GLOBAL_CONFIG.get("group_reply_window", GROUP_REPLY_WINDOW))
+        except (TypeError, ValueError):
+            return GROUP_REPLY_WINDOW
+
+    def add(self, bot, chat_id, user, message_id):
+        key = (chat_id, user.id)
+        if key in self.greeted:
+            return False
+        self.greeted.add(key)
+        if chat_id not in self._pending:
+            self._pending[chat_id] = (bot, message_id, {})
+            self._timers[chat_id] = asyncio.create_task(self._send_later(chat_id))
+        else:
+            self.coalesced += 1
+        self._pending[chat_id][2][user.id] = user.mention_html()
+        return True
+
+    async def _send_later(self, chat_id):
+        try:
+            await asyncio.sleep(self.current_window())
+        finally:
+            self._timers.pop(chat_id, None)
+        await self._send(chat_id)
+
+    async def _send(self, chat_id):
+        pending = self._pending.pop(chat_id, None)
+        if not pending:
+            return
+        bot, message_id, users = pending
+        mentions = list(users.values())
+        for i in range(0, len(mentions), GROUP_REPLY_MAX_MENTIONS):
+            try:
+                await bot.send_message(
+                    chat_id, group_welcome_text(mentions[i:i + GROUP_REPLY_MAX_MENTIONS]),
+                    parse_mode=ParseMode.HTML,
+                    disable_web_page_preview=False,  # ভিডিও প্রিভিউ দেখানোর জন্য False রাখা হলো
+                    reply_parameters=ReplyParameters(message_id, allow_sending_without_reply=True) if len(mentions) == 1 else None,
+                )
+                self.sent += 1
+            except Exception as e:
+                logger.error(f"Error sending group reply: {e}")
+
+    async def close(self):
+        # বন্ধ হওয়ার সময় অপেক্ষমাণ রিপ্লাইগুলো সাথে সাথে পাঠিয়ে দেওয়া হয়
+        for task in list(self._timers.values()):
+            task.cancel()
+        self._timers.clear()
+        for chat_id in list(self._pending):
+            await self._send(chat_id)
+
+group_replies = GroupReplyCoalescer()
 
 # --- KEYBOARDS ---
 def get_main_menu_kb():
@@ -215,11 +1596,27 @@ def get_admin_menu_kb():
         [InlineKeyboardButton("📊 পরিসংখ্যান (Stats)", callback_data="admin_stats")],
         [InlineKeyboardButton("🎥 ভিডিও লিংক পরিবর্তন", callback_data="admin_set_video")],
         [InlineKeyboardButton("👤 অ্যাডমিন ইউজারনেম সেট", callback_data="admin_set_username")],
+        [InlineKeyboardButton("🔁 কিওয়ার্ড রিলোড", callback_data="admin_reload_keywords")],
         [InlineKeyboardButton("❌ প্যানেল বন্ধ করুন", callback_data="admin_close")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def update_queue_line():
+    if not update_processor:
+        return ""
+    m = update_processor.metrics()
+    return f"⚙️ Queue: {m['queue_depth']} waiting / {m['active']} active (avg wait {m['avg_wait'] * 1000:.0f}ms)\n"
+
+def render_admin_stats(stats):
+    return f"📊 **Live Stats**\n\n" \
+           f"✅ Passed Users: {stats.get('passed_users', 0)}\n" \
+           f"📝 Interviews Started: {stats.get('total_interviews', 0)}\n\n" \
+           f"{render_funnel_stats(stats)}\n" \
+           f"{update_queue_line()}" \
+           f"📅 Time: {datetime.now().strftime('%H:%M')}"
+
 # --- HANDLERS ---
+@instrument("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user = update.effective_user
@@ -247,6 +1644,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Start Error: {e}")
         await update.message.reply_text("হ্যালো! বট চালু আছে। নিচে ক্লিক করুন:", reply_markup=get_main_menu_kb())
 
+@instrument("button_handler")
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
@@ -257,11 +1655,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if data.startswith("admin_") and user_id in ADMIN_IDS:
         if data == "admin_stats":
-            stats = await get_stats_safe()
-            msg = f"📊 **Live Stats**\n\n" \
-                  f"✅ Passed Users: {stats.get('passed_users', 0)}\n" \
-                  f"📝 Interviews Started: {stats.get('total_interviews', 0)}\n" \
-                  f"📅 Time: {datetime.now().strftime('%H:%M')}"
+            msg = render_admin_stats(await get_stats_safe())
             await query.edit_message_text(msg, reply_markup=get_admin_menu_kb(), parse_mode=ParseMode.MARKDOWN)
             return
         elif data == "admin_set_video":
@@ -272,6 +1666,10 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data['admin_state'] = 'WAITING_ADMIN_USER'
             await query.edit_message_text("👤 স্লিপে দেখানোর জন্য অ্যাডমিন ইউজারনেম সেন্ড করুন (Example: @MyUser):")
             return
+        elif data == "admin_reload_keywords":
+            await load_config_to_cache()
+            await query.edit_message_text(f"🔁 গ্রুপ কিওয়ার্ড রিলোড হয়েছে। মোট কিওয়ার্ড: {len(group_matcher.keywords)}", reply_markup=get_admin_menu_kb())
+            return
         elif data == "admin_close":
             await query.delete_message()
             return
@@ -283,34 +1681,31 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("✅ আপনি ইতিমধ্যে ইন্টারভিউ পাস করেছেন। আপনার স্লিপ পেতে 'Slip' লিখুন।")
             return
         if user_data.get("state") == "IDLE":
-             asyncio.create_task(increment_stat("total_interviews"))
-        user_data["state"] = "READY_CHECK"
+            await increment_stat("total_interviews")
+        move_state(user_data, "READY_CHECK")
         await update_user_data(user_id, user_data)
         keyboard = [[InlineKeyboardButton("✅ আমি প্রস্তুত", callback_data="confirm_ready")]]
         await query.edit_message_text("আপনি কি ১০টি প্রশ্নের উত্তর দিতে প্রস্তুত?", reply_markup=InlineKeyboardMarkup(keyboard))
     elif data == "confirm_ready":
-        user_data["state"] = "INTERVIEW"
+        move_state(user_data, "INTERVIEW")
         user_data["q_index"] = 0
         user_data["answers"] = []
+        user_data["started_at"] = int(time.time())
         await update_user_data(user_id, user_data)
         await query.edit_message_text(f"চমৎকার! ১ম প্রশ্ন:\n\n{QUESTIONS[0]['q']}")
     elif data == "accept_terms":
-        user_data["state"] = "WAITING_PHRASE"
+        move_state(user_data, "WAITING_PHRASE")
         await update_user_data(user_id, user_data)
         await query.edit_message_text(f"শর্তগুলো মানলে নিচের বাক্যটি লিখে মেসেজ দিন:\n\n`{STATIC_CONFIG['final_phrase']}`", parse_mode=ParseMode.MARKDOWN)
     elif data == "reset_me":
         await delete_user_data(user_id)
         await query.edit_message_text("🔄 আপনার সকল তথ্য রিসেট করা হয়েছে। আপনি চাইলে আবার শুরু করতে পারেন।", reply_markup=get_main_menu_kb())
 
+@instrument("handle_message")
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.effective_message or not update.effective_message.text:
         return
 
-    # --- GROUP MESSAGE HANDLER REDIRECT ---
-    if update.effective_chat.type != 'private':
-        await handle_group_messages(update, context)
-        return
-
     user = update.effective_user
     user_id = user.id
     msg = update.message.text.strip()
@@ -343,20 +1738,16 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if idx >= len(QUESTIONS): idx = len(QUESTIONS) - 1
         current_q = QUESTIONS[idx]
         
-        is_correct = False
-        for ans in current_q['a']:
-            if token_set_ratio(msg.lower(), ans.lower()) >= current_q['threshold']:
-                is_correct = True
-                break
-        
-        if is_correct:
-            user_data["answers"].append({"q": current_q['q'], "a": msg})
+        passed = grader.grade(idx, msg)
+        record_answer(idx, msg, passed)
+        if passed:
+            user_data["answers"].append({"qid": current_q['id'], "a": msg, "ts": int(time.time())})
             if idx + 1 < len(QUESTIONS):
                 user_data["q_index"] = idx + 1
                 await update_user_data(user_id, user_data)
                 await update.message.reply_text(f"✅ সঠিক! পরবর্তী প্রশ্ন:\n\n{QUESTIONS[idx+1]['q']}")
             else:
-                user_data["state"] = "TERMS"
+                move_state(user_data, "TERMS")
                 await update_user_data(user_id, user_data)
                 kb = [[InlineKeyboardButton("🤝 আমি সকল শর্ত মেনে নিচ্ছি", callback_data="accept_terms")]]
                 await update.message.reply_text(f"অভিনন্দন! সব প্রশ্নের উত্তর দিয়েছেন।\n\n{STATIC_CONFIG['terms_text']}", reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.MARKDOWN)
@@ -364,11 +1755,12 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ উত্তরটি সঠিক হয়নি। ভিডিওটি আবার দেখে চেষ্টা করুন।")
 
     elif state == "WAITING_PHRASE":
-        if token_set_ratio(msg.lower(), STATIC_CONFIG['final_phrase'].lower()) > 85:
-            user_data["state"] = "PASSED"
+        if grader.similarity(msg, FINAL_PHRASE_NORM) > 85:
+            move_state(user_data, "PASSED")
             user_data["passed"] = True
+            record_time_to_pass(user_data)
             await update_user_data(user_id, user_data)
-            asyncio.create_task(increment_stat("passed_users"))
+            await increment_stat("passed_users")
             form_text = f"⚡ Official Notice ⚡\n\n✅ আপনার ইন্টারভিউ সফল হয়েছে।\n📋 এখন এই ফর্মটি পূরণ করুন: <a href='{STATIC_CONFIG['form_link']}'>Form Link</a>\n\nফর্ম পূরণ শেষে আপনার স্লিপ পেতে 'Slip' লিখুন।"
             await update.message.reply_text(form_text, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
         else:
@@ -384,76 +1776,632 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             slip += f"• {item['a']}\n"
         slip += f"━━━━━━━━━━━━━━━\n✅ এই স্লিপটি এডমিনকে দিন: {admin_user}"
         await update.message.reply_text(slip, parse_mode=ParseMode.HTML)
-        for adm in ADMIN_IDS:
-            try: await context.bot.send_message(adm, f"🚀 New Candidate Passed!\n\n{slip}", parse_mode=ParseMode.HTML)
-            except: pass
+        await notify_admins(context.bot, f"🚀 New Candidate Passed!\n\n{slip}", parse_mode=ParseMode.HTML)
 
+@instrument("handle_group_messages")
 async def handle_group_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.effective_message or not update.effective_message.text:
         return
 
     if update.effective_chat.type != 'private':
         try:
-            user_id = update.effective_user.id
-            chat_id = update.effective_chat.id
-            member = await context.bot.get_chat_member(chat_id, user_id)
-            if member.status in ['creator', 'administrator']:
+            if await chat_admins.is_admin(context.bot, update.effective_chat.id, update.effective_user.id):
                 return
         except Exception:
             pass
 
         msg = update.effective_message.text.strip().lower()
         user = update.effective_user
-        
-        # অ্যাডমিন প্যানেল থেকে সেট করা ভিডিও লিংক
-        video_link = GLOBAL_CONFIG.get("video_link", "https://t.me/skyzoneit/6300")
-
-        keywords = [
-            "it", "হ্যালো", "hello", "hi", "হাই", "কি কাজ", "কাজ কি", "কাজ কী", 
-            "kaj ki", "ki kaj", "আমি কাজ করতে চাই", "ami kaj korte chai", 
-            "কাজ চাই", "আমি নতুন", "ami notun", "i am new", "ami new", 
-            "আমি গ্রুপের নতুন মেম্বার", "ami group e number", "ami group e notun",
-            "কিভাবে কাজ করব", "help me", "টাকা ইনকাম", "income", 
-            "কাজ শিখব", "ভাই কাজ আছে", "kaj ache", "kaj hobe", "work"
-        ]
-        
-        match_found = any(key in msg for key in keywords)
+
+        match_found = group_matcher.search(msg) is not None
 
         if match_found:
-            # নতুন ব্যবহারকারীদের জন্য সরাসরি ভিডিও লিংক এবং নির্দেশনা
-            response_text = (
-                f"আসসালামু আলাইকুম {user.mention_html()}!\n\n"
-                f"যেহেতু আপনি আমাদের এখানে নতুন। তাই ভিডিওটি দেখুন। "
-                f"এই ভিডিওটি দেখে আপনি কাজ শিখুন এবং কি করতে হবে বুঝে যাবেন।\n\n"
-                f"🎥 <b>কাজের ভিডিও লিংক:</b>\n{video_link}"
-            )
-            
+            # নতুন ব্যবহারকারীদের জন্য ভিডিও লিংক; কাছাকাছি সময়ের সবাইকে একটা মেসেজেই জানানো হয়
+            group_replies.add(context.bot, update.effective_chat.id, user, update.effective_message.message_id)
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS or update.effective_chat.type != 'private':
+        return
+    text = update.message.text.partition(" ")[2].strip()
+    if not text:
+        await update.message.reply_text("ব্যবহার: /broadcast <মেসেজ>\nপাস করা সব ইউজারকে মেসেজটি পাঠানো হবে।")
+        return
+    status = await update.message.reply_text("📢 ব্রডকাস্ট শুরু হয়েছে...")
+
+    async def progress(sent, failed, done):
+        label = "✅ ব্রডকাস্ট শেষ" if done else "📢 ব্রডকাস্ট চলছে"
+        try:
+            await status.edit_text(f"{label}\nপাঠানো হয়েছে: {sent}\nব্যর্থ: {failed}")
+        except Exception as e:
+            logger.error(f"Broadcast Progress Error: {e}")
+
+    # হ্যান্ডলার আটকে না রেখে ব্যাকগ্রাউন্ডে পাঠানো
+    context.application.create_task(broadcast(context.bot, iter_passed_user_ids(), text, progress=progress))
+
+async def track_chat_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    change = update.chat_member
+    if change:
+        chat_admins.apply_member_update(change.chat.id, change.new_chat_member.user.id, change.new_chat_member.status)
+
+# --- OUTBOUND RATE LIMITER ---
+# সব Bot API রিকোয়েস্ট এখান দিয়ে যায়: গ্লোবাল আর প্রতি-চ্যাট token bucket,
+# আর 429/RetryAfter এলে অপেক্ষা করে আবার পাঠানো হয়, মেসেজ হারায় না
+RATE_GLOBAL_PER_SEC = float(os.environ.get("RATE_GLOBAL_PER_SEC", 30))
+RATE_PRIVATE_PER_SEC = float(os.environ.get("RATE_PRIVATE_PER_SEC", 1))
+RATE_GROUP_PER_MIN = float(os.environ.get("RATE_GROUP_PER_MIN", 20))
+RATE_MAX_RETRIES = int(os.environ.get("RATE_MAX_RETRIES", 3))
+RATE_BUCKET_IDLE = 300
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()  # অপেক্ষমাণ রিকোয়েস্টগুলো FIFO ক্রমে যায়
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def idle(self):
+        self._refill()
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class OutboundRateLimiter(BaseRateLimiter):
+    THROTTLED_PREFIXES = ("send", "edit", "forward", "copy")
+
+    def __init__(self, max_retries=RATE_MAX_RETRIES):
+        self.max_retries = max_retries
+        self._global = TokenBucket(RATE_GLOBAL_PER_SEC, RATE_GLOBAL_PER_SEC)
+        self._chats = {}  # chat_id -> TokenBucket
+        self._paused_until = 0.0
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                # অনেকক্ষণ অলস থাকা বাকেটগুলো বাদ দিয়ে মেমরি সীমিত রাখা
+                self._chats = {k: b for k, b in self._chats.items() if not (b.idle() and time.monotonic() - b.updated > RATE_BUCKET_IDLE)}
             try:
-                await update.effective_message.reply_text(
-                    response_text, 
-                    parse_mode='HTML', 
-                    disable_web_page_preview=False # ভিডিও প্রিভিউ দেখানোর জন্য False রাখা হলো
-                )
-            except Exception as e:
-                logger.error(f"Error sending group reply: {e}")
+                is_group = int(chat_id) < 0
+            except (TypeError, ValueError):
+                is_group = True  # @channelusername
+            if is_group:
+                bucket = TokenBucket(RATE_GROUP_PER_MIN / 60, 5)
+            else:
+                bucket = TokenBucket(RATE_PRIVATE_PER_SEC, 3)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        max_retries = rate_limit_args if rate_limit_args is not None else self.max_retries
+        chat_id = data.get("chat_id")
+        throttled = endpoint.startswith(self.THROTTLED_PREFIXES)
+        attempt = 0
+        while True:
+            if throttled:
+                if chat_id is not None:
+                    await self._chat_bucket(chat_id).acquire()
+                await self._global.acquire()
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else float(e.retry_after)
+                # একটা 429 মানে পুরো বটকেই থামতে হবে
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                if attempt >= max_retries:
+                    self.failed += 1
+                    logger.error(f"Flood limit: giving up {endpoint} to {chat_id} after {attempt} retries")
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Flood limit on {endpoint}, retrying in {retry_after}s")
+
+    def metrics(self):
+        return {"sent": self.sent, "retries": self.retries, "failed": self.failed, "chats": len(self._chats)}
+
+rate_limiter = OutboundRateLimiter()
+
+# --- BROADCAST ---
+BROADCAST_PAGE_SIZE = 300
+BROADCAST_IN_FLIGHT = 50
+BROADCAST_PROGRESS_EVERY = 5  # seconds
+
+async def iter_passed_user_ids(page_size=BROADCAST_PAGE_SIZE):
+    # পুরো কালেকশন একসাথে না এনে পেজ করে স্ট্রিম করা হয়
+    async for user_id, _ in storage.iter_users([("passed", "==", True)], page_size):
+        yield int(user_id)
+
+async def broadcast(bot, recipients, text, progress=None, **send_kwargs):
+    # রেট লিমিটার নিজেই গতি নিয়ন্ত্রণ করে, এখানে শুধু একসাথে কত টাস্ক চলবে সেটা সীমিত
+    counts = {"sent": 0, "failed": 0}
+    slots = asyncio.Semaphore(BROADCAST_IN_FLIGHT)
+    tasks = set()
+    last_report = time.monotonic()
+
+    async def send_one(chat_id):
+        try:
+            await bot.send_message(chat_id, text, **send_kwargs)
+            counts["sent"] += 1
+        except Exception as e:
+            counts["failed"] += 1
+            logger.warning(f"Broadcast to {chat_id} failed: {e}")
+        finally:
+            slots.release()
+
+    async for chat_id in recipients:
+        await slots.acquire()
+        task = asyncio.create_task(send_one(chat_id))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        if progress and time.monotonic() - last_report >= BROADCAST_PROGRESS_EVERY:
+            last_report = time.monotonic()
+            await progress(counts["sent"], counts["failed"], False)
+    if tasks:
+        await asyncio.gather(*tasks)
+    if progress:
+        await progress(counts["sent"], counts["failed"], True)
+    return counts
+
+async def notify_admins(bot, text, **send_kwargs):
+    async def iter_admins():
+        for adm in ADMIN_IDS:
+            yield adm
+    return await broadcast(bot, iter_admins(), text, **send_kwargs)
+
+# --- CONCURRENT UPDATE PROCESSING ---
+# আলাদা ইউজারের আপডেট একসাথে চলে, কিন্তু একই ইউজারের আপডেট সবসময় আসার ক্রমেই চলে
+# (user_data এর read-modify-write যেন race না করে)
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", 32))
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates=UPDATE_CONCURRENCY):
+        # বেস ক্লাসের সেমাফোর কখনো আটকায় না, যাতে আপডেটগুলো আসার ক্রমেই
+        # do_process_update এ ঢোকে; আসল লিমিট নিচের _slots দিয়ে
+        super().__init__(2 ** 31 - 1)
+        self.concurrency = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks = {}  # user key -> [asyncio.Lock, pending count]
+        self.pending = 0
+        self.active = 0
+        self.processed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @staticmethod
+    def _key(update):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return ("user", update.effective_user.id)
+            if update.effective_chat:
+                return ("chat", update.effective_chat.id)
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        key = self._key(update)
+        queued_at = time.monotonic()
+        self.pending += 1
+        entry = None
+        if key is not None:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+        started = False
+        try:
+            async with (entry[0] if entry else contextlib.nullcontext()):
+                async with self._slots:
+                    wait = time.monotonic() - queued_at
+                    self.wait_total += wait
+                    self.wait_max = max(self.wait_max, wait)
+                    started = True
+                    self.pending -= 1
+                    self.active += 1
+                    try:
+                        await coroutine
+                    finally:
+                        self.active -= 1
+                        self.processed += 1
+        finally:
+            if not started:
+                self.pending -= 1
+                coroutine.close()
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._locks.pop(key, None)
+
+    def metrics(self):
+        return {
+            "queue_depth": self.pending,
+            "active": self.active,
+            "processed": self.processed,
+            "users_waiting": len(self._locks),
+            "avg_wait": self.wait_total / self.processed if self.processed else 0.0,
+            "max_wait": self.wait_max,
+        }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+update_processor = PerUserUpdateProcessor() if UPDATE_CONCURRENCY > 1 else None
+
+# --- METRICS ENDPOINT ---
+USER_STATES = ("IDLE", "READY_CHECK", "INTERVIEW", "TERMS", "WAITING_PHRASE", "PASSED")
+
+def render_metrics():
+    # Prometheus text format
+    lines = []
+
+    def metric(name, kind, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def histograms(name, label, timer):
+        metric(name, "histogram", f"Sampled latency in seconds (1 in {timer.sample_every} calls)")
+        for key, hist in timer.latency.items():
+            cumulative = 0
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label}="{key}",le="+Inf"}} {hist.count}')
+            lines.append(f'{name}_sum{{{label}="{key}"}} {hist.sum}')
+            lines.append(f'{name}_count{{{label}="{key}"}} {hist.count}')
+
+    def counters(name, label, values, help_text, kind="counter"):
+        metric(name, kind, help_text)
+        for key, value in values.items():
+            lines.append(f'{name}{{{label}="{key}"}} {value}')
+
+    counters("bot_handler_calls_total", "handler", handler_metrics.calls, "Handler invocations")
+    counters("bot_handler_errors_total", "handler", handler_metrics.errors, "Handler invocations that raised")
+    histograms("bot_handler_latency_seconds", "handler", handler_metrics)
+
+    counters("bot_storage_ops_total", "op", storage.ops, f"Storage operations ({storage.name} backend)")
+    counters("bot_storage_errors_total", "op", storage_metrics.errors, "Storage operations that raised")
+    histograms("bot_storage_latency_seconds", "op", storage_metrics)
+
+    metric("bot_executor_queue_depth", "gauge", "Tasks waiting for an executor thread")
+    lines.append(f"bot_executor_queue_depth {executor.queued}")
+    metric("bot_executor_active_threads", "gauge", "Executor threads running a task right now")
+    lines.append(f"bot_executor_active_threads {executor.active}")
+
+    counters("bot_outbound_total", "result", {"sent": rate_limiter.sent, "retried": rate_limiter.retries, "failed": rate_limiter.failed}, "Bot API requests through the rate limiter")
+    counters("bot_group_replies_total", "result", {"sent": group_replies.sent, "coalesced": group_replies.coalesced}, "Group welcome messages sent and mentions merged into another message")
+
+    if update_processor:
+        m = update_processor.metrics()
+        metric("bot_update_queue_depth", "gauge", "Updates waiting for a worker slot or their user's previous update")
+        lines.append(f"bot_update_queue_depth {m['queue_depth']}")
+        metric("bot_updates_active", "gauge", "Updates being processed")
+        lines.append(f"bot_updates_active {m['active']}")
+        metric("bot_update_wait_seconds_total", "counter", "Total time updates spent queued")
+        lines.append(f"bot_update_wait_seconds_total {update_processor.wait_total}")
+
+    by_state = Counter({state: 0 for state in USER_STATES})
+    by_state.update(user_cache.count_by_state())
+    counters("bot_users", "state", by_state, "Recently active (cached) users per interview state", kind="gauge")
+
+    return "\n".join(lines) + "\n"
+
+@http_server.route("GET", "/metrics")
+async def metrics_route(request):
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- EXPORT ---
+# users কালেকশন পেজ করে পড়ে CSV/JSONL বানিয়ে gzip করা হয়, পুরো কালেকশন কখনো RAM এ আসে না।
+# ইনক্রিমেন্টাল এক্সপোর্ট শুধু শেষ চেকপয়েন্টের পরে বদলানো ইউজারদের পড়ে (updated_at দিয়ে)।
+# Firestore এ ফিল্টারের সাথে updated_at অনুযায়ী সাজাতে composite index লাগে।
+# updated_at চালুর আগের ডকুমেন্টে ফিল্ডটা নেই, তারিখ ফিল্টারে সেগুলো আসে না; migrate_users.py সেটা ভরে দেয়।
+EXPORT_PAGE_SIZE = 500
+EXPORT_SETTLE = 60  # এর চেয়ে নতুন রাইট পরের এক্সপোর্টে যাবে (write-behind ফ্লাশ শেষ হওয়ার সময়)
+EXPORT_CHECKPOINT_KEY = "_export_checkpoint"
+EXPORT_COLUMNS = ["user_id", "state", "passed", "q_index", "updated_at"] + [f"q{q['id']}" for q in QUESTIONS]
+ADMIN_HTTP_TOKEN = os.environ.get("ADMIN_HTTP_TOKEN", "")
+
+def parse_export_date(value, end=False):
+    # until এর দিনটাও এক্সপোর্টে থাকে: end=True হলে পরের দিনের শুরু (যেটা < দিয়ে তুলনা হয়)
+    day = datetime.strptime(value, "%Y-%m-%d")
+    return int((day + timedelta(days=1) if end else day).timestamp())
+
+async def export_plan(passed=None, state=None, since=None, until=None, incremental=False):
+    # ফেরত: (where, order_by, নতুন চেকপয়েন্ট বা None)
+    where = []
+    if passed is not None:
+        where.append(("passed", "==", passed))
+    if state:
+        where.append(("state", "==", state))
+    checkpoint = None
+    if incremental:
+        config = await storage.get_config() or {}
+        checkpoint = int(time.time()) - EXPORT_SETTLE
+        if EXPORT_CHECKPOINT_KEY in config:
+            since, until = config[EXPORT_CHECKPOINT_KEY], checkpoint
+        # চেকপয়েন্ট না থাকলে প্রথমবার পুরো এক্সপোর্ট হয়, যাতে updated_at ছাড়া পুরনো ডকুমেন্টও আসে
+        # (শেষ EXPORT_SETTLE সেকেন্ডের ইউজাররা পরের এক্সপোর্টে আবারও আসতে পারে)
+    if since is not None:
+        where.append(("updated_at", ">=", since))
+    if until is not None:
+        where.append(("updated_at", "<", until))
+    return where, ("updated_at" if since is not None or until is not None else None), checkpoint
+
+def export_row(user_id, data):
+    row = {"user_id": user_id, "state": data.get("state"), "passed": data.get("passed", False),
+           "q_index": data.get("q_index"), "updated_at": data.get("updated_at")}
+    for item in data.get("answers") or []:
+        if "qid" in item:
+            row[f"q{item['qid']}"] = item.get("a")
+    return row
+
+async def export_chunks(fmt, where, order_by):
+    # gzip করা bytes চাংক আকারে, প্রতি পেজে একবার
+    compressor = zlib.compressobj(wbits=31)
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS, extrasaction="ignore") if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+    count = 0
+    async for user_id, data in storage.iter_users(where, EXPORT_PAGE_SIZE, order_by):
+        if writer:
+            writer.writerow(export_row(user_id, data))
+        else:
+            buf.write(json.dumps({"user_id": user_id, **data}, ensure_ascii=False, default=str) + "\n")
+        count += 1
+        if count % EXPORT_PAGE_SIZE == 0:
+            yield compressor.compress(buf.getvalue().encode())
+            buf.seek(0)
+            buf.truncate()
+    yield compressor.compress(buf.getvalue().encode()) + compressor.flush()
+
+async def save_export_checkpoint(checkpoint):
+    if checkpoint is not None:
+        await storage.set_config({EXPORT_CHECKPOINT_KEY: checkpoint})
+
+@http_server.route("GET", "/export")
+async def export_route(request):
+    auth = request.headers.get("authorization", "")
+    if not ADMIN_HTTP_TOKEN or not hmac.compare_digest(auth, f"Bearer {ADMIN_HTTP_TOKEN}"):
+        return HttpResponse("Forbidden", status=403)
+    q = request.query
+    fmt = "csv" if q.get("format", "csv") == "csv" else "jsonl"
+    try:
+        passed = {"1": True, "true": True, "0": False, "false": False}.get(q.get("passed", "").lower())
+        since = parse_export_date(q["since"]) if q.get("since") else None
+        until = parse_export_date(q["until"], end=True) if q.get("until") else None
+    except ValueError:
+        return HttpResponse("Bad date, use YYYY-MM-DD", status=400)
+    where, order_by, checkpoint = await export_plan(passed, q.get("state", "").upper(), since, until, q.get("incremental") == "1")
+
+    async def body():
+        async for chunk in export_chunks(fmt, where, order_by):
+            yield chunk
+        # পুরো স্ট্রিম সফল হলেই চেকপয়েন্ট আগায়
+        await save_export_checkpoint(checkpoint)
+
+    filename = f"users-{datetime.now().strftime('%Y%m%d-%H%M')}.{fmt}.gz"
+    return HttpResponse(body(), content_type="application/gzip", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS or update.effective_chat.type != 'private':
+        return
+    # /export [csv|jsonl] [passed|failed] [state=X] [since=YYYY-MM-DD] [until=YYYY-MM-DD] [new]
+    fmt, passed, state, since, until, incremental = "csv", None, None, None, None, False
+    try:
+        for arg in context.args:
+            key, _, value = arg.partition("=")
+            if arg in ("csv", "jsonl"):
+                fmt = arg
+            elif arg in ("passed", "failed"):
+                passed = arg == "passed"
+            elif arg == "new":
+                incremental = True
+            elif key == "state":
+                state = value.upper()
+            elif key == "since":
+                since = parse_export_date(value)
+            elif key == "until":
+                until = parse_export_date(value, end=True)
+    except ValueError:
+        await update.message.reply_text("তারিখ এভাবে দিন: since=2024-01-31")
+        return
+    await update.message.reply_text("📦 এক্সপোর্ট তৈরি হচ্ছে...")
+
+    async def run():
+        try:
+            where, order_by, checkpoint = await export_plan(passed, state, since, until, incremental)
+            with tempfile.TemporaryFile() as f:
+                async for chunk in export_chunks(fmt, where, order_by):
+                    f.write(chunk)
+                f.seek(0)
+                filename = f"users-{datetime.now().strftime('%Y%m%d-%H%M')}.{fmt}.gz"
+                await context.bot.send_document(update.effective_chat.id, document=f, filename=filename)
+            await save_export_checkpoint(checkpoint)
+        except Exception as e:
+            logger.error(f"Export Error: {e}")
+            await context.bot.send_message(update.effective_chat.id, "❌ এক্সপোর্ট ব্যর্থ হয়েছে।")
+
+    context.application.create_task(run())
+
+# --- WEBHOOK MODE ---
+# WEBHOOK_URL সেট থাকলে long polling এর বদলে Telegram আপডেট একই HTTP সার্ভারে আসে।
+# ডিফল্ট সেটিংসে এটা একটাই ইনস্ট্যান্সের জন্য: ইউজার স্টেট ক্যাশ আর per-user ক্রম প্রসেসের ভেতরে থাকে।
+# একাধিক ইনস্ট্যান্সে চালাতে হলে MULTI_INSTANCE=1 দিন (USER STATE CACHE এর নোট দেখুন)
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_QUEUE_SIZE = int(os.environ.get("WEBHOOK_QUEUE_SIZE", 1000))
+
+def webhook_secret():
+    # সিক্রেট ছাড়া যে কেউ অ্যাডমিনের আইডি দিয়ে নকল আপডেট পাঠাতে পারত, তাই সবসময় একটা সিক্রেট থাকে।
+    # সেট না থাকলে এই রানের জন্য র‍্যান্ডম একটা বানিয়ে set_webhook এ পাঠানো হয়
+    global WEBHOOK_SECRET
+    if not WEBHOOK_SECRET:
+        if MULTI_INSTANCE:
+            # প্রতিটি ইনস্ট্যান্স আলাদা সিক্রেট বানালে শেষেরটা ছাড়া বাকিরা সব আপডেট ফিরিয়ে দিত
+            raise RuntimeError("WEBHOOK_SECRET must be set when MULTI_INSTANCE=1")
+        WEBHOOK_SECRET = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET not set, using a random secret for this run")
+    return WEBHOOK_SECRET
+
+def webhook_backlog(application: Application):
+    # PerUserUpdateProcessor আপডেটগুলো কিউ থেকে সাথে সাথে নিজের টাস্কে নিয়ে যায়, তাই অপেক্ষমাণগুলোও গোনা হয়
+    return application.update_queue.qsize() + (update_processor.pending if update_processor else 0)
+
+def register_webhook_route(application: Application):
+    secret = webhook_secret()
+
+    @http_server.route("POST", WEBHOOK_PATH)
+    async def telegram_webhook(request):
+        token = request.headers.get("x-telegram-bot-api-secret-token", "")
+        if not hmac.compare_digest(token, secret):
+            return HttpResponse("Forbidden", status=403)
+        # কিউ ভরে গেলে 503 দিলে Telegram নিজেই পরে আবার পাঠায়
+        if webhook_backlog(application) >= WEBHOOK_QUEUE_SIZE:
+            return HttpResponse("Busy", status=503)
+        try:
+            update = Update.de_json(json.loads(request.body), application.bot)
+        except Exception as e:
+            logger.error(f"Webhook Parse Error: {e}")
+            return HttpResponse("Bad Request", status=400)
+        await application.update_queue.put(update)
+        return HttpResponse("OK")
+
+async def run_webhook(application: Application):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    await application.initialize()
+    try:
+        await post_init(application)
+        await application.start()
+        await application.bot.set_webhook(
+            url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=webhook_secret(),
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=True
+        )
+        await stop_event.wait()
+        logger.info("Shutting down: draining webhook updates")
+        # আগে নতুন আপডেট নেওয়া বন্ধ, তারপর কিউতে থাকা আপডেটগুলো প্রসেস করে থামা
+        await http_server.stop()
+        await application.stop()
+        # run_polling এর মতোই: হ্যান্ডলার থামার পরে কিন্তু বট (HTTPX) বন্ধ হওয়ার আগে
+        await post_stop(application)
+    finally:
+        await application.shutdown()
+        await post_shutdown(application)
 
 # --- POST INIT HOOK ---
+async def warm_up(application: Application):
+    # নেটওয়ার্ক আর CPU কাজগুলো একসাথে: কনফিগ (সাথে কিওয়ার্ড ম্যাচার), গ্রেডার, সাপোর্ট গ্রুপের অ্যাডমিন লিস্ট আর HTTP সার্ভার
+    loop = asyncio.get_running_loop()
+    async def config():
+        await storage.warm_up()
+        await load_config_to_cache()
+
+    tasks = {
+        "config": config(),
+        "grader": loop.run_in_executor(executor, grader.warm_up),
+        "admins": chat_admins.prefetch(application.bot, [int(GROUP_CHAT_ID)]) if GROUP_CHAT_ID.lstrip("-").isdigit() else asyncio.sleep(0),
+        "http": http_server.start(),
+    }
+    started = time.perf_counter()
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    for name, result in zip(tasks, results):
+        if isinstance(result, Exception):
+            logger.error(f"Warm-up Error ({name}): {result}")
+    logger.info(f"Warm-up done in {time.perf_counter() - started:.2f}s")
+
 async def post_init(application: Application):
-    await load_config_to_cache()
+    await warm_up(application)
+    start_config_sync()
+    if not MULTI_INSTANCE:
+        user_cache.start()
+    stats.start()
+
+async def post_stop(application: Application):
+    # application.shutdown() বটের HTTPX ক্লায়েন্ট বন্ধ করে দেয়, তাই গ্রুপের অপেক্ষমাণ রিপ্লাইগুলো তার আগেই পাঠাতে হয়
+    await group_replies.close()
+
+async def post_shutdown(application: Application):
+    stop_config_sync()
+    await http_server.stop()
+    # বন্ধ হওয়ার আগে বাকি থাকা ইউজার রাইটগুলো Firestore এ পাঠানো
+    await user_cache.close()
+    await stats.close()
+    await storage.close()
 
 # --- MAIN ---
-def main():
-    threading.Thread(target=run_flask, daemon=True).start()
-    app_tg = Application.builder().token(TOKEN).post_init(post_init).build()
-    
+def register_handlers(app_tg: Application):
     app_tg.add_handler(CommandHandler("start", start))
     app_tg.add_handler(CommandHandler("admin", start))
+    app_tg.add_handler(CommandHandler("broadcast", broadcast_command))
+    app_tg.add_handler(CommandHandler("export", export_command))
     app_tg.add_handler(CallbackQueryHandler(button_handler))
-    # গ্রুপের মেসেজ এবং প্রাইভেট মেসেজ উভয়ই এই হ্যান্ডলারের মাধ্যমে প্রসেস হবে
+    app_tg.add_handler(ChatMemberHandler(track_chat_admins, ChatMemberHandler.CHAT_MEMBER))
+    # গ্রুপের মেসেজ আলাদা হ্যান্ডলারে যায়, যাতে মেট্রিক্সে একটা মেসেজ একবারই গোনা হয়
+    app_tg.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & ~filters.ChatType.PRIVATE, handle_group_messages))
     app_tg.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+
+def build_requests():
+    # বিল্ডার নিজে দুইটা httpx ক্লায়েন্ট বানায় (API আর getUpdates) আর প্রতিটি আলাদা করে
+    # CA সার্টিফিকেট লোড করে (~১০০ms করে)। একটাই SSL context দুটোতে ব্যবহার হয়
+    import httpx
+    tls = {"verify": httpx.create_ssl_context()}
+    return HTTPXRequest(connection_pool_size=256, httpx_kwargs=tls), HTTPXRequest(connection_pool_size=1, httpx_kwargs=tls)
+
+def build_application(request=None):
+    api_request, updates_request = build_requests()
+    builder = Application.builder().token(TOKEN).request(request or api_request).get_updates_request(updates_request)
+    builder = builder.rate_limiter(rate_limiter).post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown)
+    if update_processor:
+        builder = builder.concurrent_updates(update_processor)
+    app_tg = builder.build()
+    register_handlers(app_tg)
+    return app_tg
+
+def main():
+    app_tg = build_application()
     
     print("Skyzone IT Bot Optimized V3 is running...")
-    app_tg.run_polling(drop_pending_updates=True)
+    if WEBHOOK_URL:
+        register_webhook_route(app_tg)
+        asyncio.run(run_webhook(app_tg))
+    else:
+        app_tg.run_polling(drop_pending_updates=True, allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
     main()
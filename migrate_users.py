@@ -0,0 +1,85 @@
+"""Rewrite existing user documents to the compact answer schema.
+
+Old documents store every answer as {"q": <full question text>, "a": ...}.
+This streams the users collection page by page through the configured
+storage backend and rewrites only the "answers" and "schema" fields in
+batches, so it never holds more than one page in memory. Documents without
+"updated_at" (written before it existed) get it from their newest answer
+timestamp, or the migration time, so date-filtered and incremental exports
+include them.
+
+Stop the bot before running it. "answers" is overwritten with the list read
+earlier in the page, so answers the bot appends in between would be lost;
+writes are refused unless --bot-stopped is given.
+
+    python migrate_users.py --dry-run
+    python migrate_users.py --bot-stopped --page-size 300
+"""
+import sys
+import time
+import asyncio
+import argparse
+import logging
+
+import bot
+
+QUESTION_IDS = {q["q"]: q["id"] for q in bot.QUESTIONS}
+
+def compact_answers(answers):
+    compact = []
+    for item in answers:
+        if "qid" in item or "q" not in item:
+            compact.append(item)
+            continue
+        qid = QUESTION_IDS.get(item["q"])
+        if qid is None:
+            # প্রশ্নের লেখা বদলে গেলে id পাওয়া যায় না, তখন লেখাটাই রেখে দেওয়া হয়
+            compact.append(item)
+        else:
+            compact.append({"qid": qid, "a": item.get("a", "")})
+    return compact
+
+async def migrate(page_size, dry_run):
+    scanned = migrated = 0
+    batch = []
+
+    async def write():
+        nonlocal migrated
+        if batch and not dry_run:
+            await bot.storage.update_users(batch)
+        migrated += len(batch)
+        batch.clear()
+
+    now = int(time.time())
+    async for user_id, data in bot.storage.iter_users(page_size=page_size):
+        scanned += 1
+        fields = {}
+        if data.get("schema", 1) < bot.USER_SCHEMA:
+            fields.update(answers=compact_answers(data.get("answers") or []), schema=bot.USER_SCHEMA)
+        if "updated_at" not in data:
+            fields["updated_at"] = max((a["ts"] for a in data.get("answers") or [] if "ts" in a), default=now)
+        if not fields:
+            continue
+        batch.append((user_id, fields, {}))
+        if len(batch) >= page_size:
+            await write()
+            print(f"scanned {scanned}, migrated {migrated}", file=sys.stderr)
+    await write()
+    await bot.storage.close()
+    return scanned, migrated
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate user documents to the compact answer schema")
+    parser.add_argument("--page-size", type=int, default=300, help="documents read and written per batch")
+    parser.add_argument("--dry-run", action="store_true", help="count documents without writing")
+    parser.add_argument("--bot-stopped", action="store_true", help="confirm no bot instance is running (required to write)")
+    args = parser.parse_args()
+    if not args.dry_run and not args.bot_stopped:
+        parser.error("stop the bot first and pass --bot-stopped (a running bot's new answers would be overwritten)")
+    logging.disable(logging.INFO)
+    scanned, migrated = asyncio.run(migrate(args.page_size, args.dry_run))
+    action = "would migrate" if args.dry_run else "migrated"
+    print(f"Done: scanned {scanned}, {action} {migrated}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# bot.py মডিউল লোডের সময় এগুলো পড়ে, তাই ইমপোর্টের আগেই সেট করা হয়
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.pop("MULTI_INSTANCE", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+
+class SlowStorage(bot.MemoryStorage):
+    # প্রতিটি রাইটে দেরি, যাতে ফ্লাশ চলার মাঝেই close/get ডাকা যায়
+    def __init__(self, delay=0.2, fail=0):
+        super().__init__()
+        self.delay = delay
+        self.fail = fail
+
+    async def _update_users(self, items):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("write failed")
+        await super()._update_users(items)
+
+    async def _increment_stats(self, deltas):
+        await asyncio.sleep(self.delay)
+        await super()._increment_stats(deltas)
+
+
+@pytest.fixture
+def slow_storage(monkeypatch):
+    storage = SlowStorage()
+    monkeypatch.setattr(bot, "storage", storage)
+    return storage
@@ -0,0 +1,37 @@
+# user-016: admin_stats প্যানেল ParseMode.MARKDOWN এ যায়, অসম্পূর্ণ entity থাকলে Telegram পুরো মেসেজটাই ফিরিয়ে দেয়
+import pytest
+
+import bot
+
+
+def assert_balanced_markdown(text):
+    # Telegram এর পুরনো Markdown: * _ ` জোড়ায় জোড়ায় থাকতে হবে, [ এর সাথে ]
+    for mark in "*_`":
+        assert text.count(mark) % 2 == 0, f"unbalanced {mark!r} in: {text}"
+    assert text.count("[") == text.count("]")
+
+
+def full_stats():
+    data = {"passed_users": 12, "total_interviews": 40}
+    for state_from, state_to in zip(bot.FUNNEL_STATES, bot.FUNNEL_STATES[1:]):
+        data[f"fn_{state_from.lower()}_to_{state_to.lower()}"] = 10
+    for q in bot.QUESTIONS:
+        key = f"q{q['id']}"
+        data.update({f"{key}_attempts": 9, f"{key}_failures": 3, f"{key}_near": 1, f"{key}_scored": 2, f"{key}_score_sum": 150, f"{key}_score_7": 2})
+    for minutes in bot.TIME_TO_PASS_BUCKETS:
+        data[f"ttp_le_{minutes}m"] = 1
+    data[f"ttp_gt_{bot.TIME_TO_PASS_BUCKETS[-1]}m"] = 1
+    return data
+
+
+@pytest.mark.parametrize("stats", [{}, full_stats()], ids=["empty", "full"])
+def test_admin_stats_panel_is_valid_markdown(stats):
+    text = bot.render_admin_stats(stats)
+    assert_balanced_markdown(text)
+    assert "Live Stats" in text
+
+
+def test_funnel_section_lists_questions_and_time_to_pass():
+    text = bot.render_funnel_stats(full_stats())
+    assert f"Q{bot.QUESTIONS[0]['id']}: 9 / 33% / 1 / 75 / {bot.grader.thresholds[0]}" in text
+    assert "পাসের সময়" in text
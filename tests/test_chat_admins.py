@@ -0,0 +1,32 @@
+# user-004: অ্যাডমিন লিস্ট একবারই লোড হয়, আর একজন অপেক্ষাকারী বাতিল হলে বাকিদের লোড বাতিল হয় না
+import asyncio
+
+import bot
+
+
+class Member:
+    def __init__(self, user_id):
+        self.user = type("User", (), {"id": user_id})()
+
+
+class SlowBot:
+    def __init__(self):
+        self.calls = 0
+
+    async def get_chat_administrators(self, chat_id):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return [Member(7)]
+
+
+def test_cancelled_waiter_does_not_cancel_shared_load():
+    async def run():
+        cache = bot.ChatAdminCache()
+        fake = SlowBot()
+        first = asyncio.create_task(cache.is_admin(fake, -100, 7))
+        second = asyncio.create_task(cache.is_admin(fake, -100, 8))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return fake.calls, await second, await cache.is_admin(fake, -100, 7)
+
+    assert asyncio.run(run()) == (1, False, True)
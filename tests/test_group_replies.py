@@ -0,0 +1,41 @@
+# user-017: গ্রুপের অপেক্ষমাণ রিপ্লাইগুলো বট বন্ধ হওয়ার আগে (post_stop এ) পাঠানো হয়
+import asyncio
+
+import bot
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+    def mention_html(self):
+        return f'<a href="tg://user?id={self.id}">{self.id}</a>'
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def test_post_stop_flushes_pending_group_replies(monkeypatch):
+    replies = bot.GroupReplyCoalescer(window=60)
+    monkeypatch.setattr(bot, "group_replies", replies)
+    fake = FakeBot()
+
+    async def run():
+        replies.add(fake, -100, FakeUser(1), 10)
+        replies.add(fake, -100, FakeUser(2), 11)
+        await bot.post_stop(None)
+
+    asyncio.run(run())
+    assert len(fake.sent) == 1
+    assert "id=1" in fake.sent[0][1] and "id=2" in fake.sent[0][1]
+    assert replies.coalesced == 1
+
+
+def test_application_flushes_group_replies_on_stop():
+    application = bot.build_application()
+    assert application.post_stop is bot.post_stop
@@ -0,0 +1,35 @@
+# user-003: গ্রুপ মেসেজের কিওয়ার্ড পুরো শব্দ হিসেবে মেলানো (বাংলা কার-চিহ্নসহ)
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def matcher():
+    return bot.KeywordMatcher(["hi", "kaj ki", "কাজ", "income"])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("hi", "hi"),
+    ("Hi there", "hi"),
+    ("ভাই, hi!", "hi"),
+    ("kaj   ki?", "kaj ki"),
+    ("আমি কাজ চাই", "কাজ"),
+    ("my income", "income"),
+])
+def test_matches_whole_words(matcher, text, expected):
+    assert matcher.search(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "this", "hint", "nothing", "incomes", "kaj kii",
+    "কাজে",  # কার-চিহ্ন শব্দের অংশ
+])
+def test_ignores_partial_words(matcher, text):
+    assert matcher.search(text) is None
+
+
+def test_overlapping_keywords():
+    matcher = bot.KeywordMatcher(["ami", "ami notun"])
+    assert matcher.search("ami notun") in ("ami", "ami notun")
+    assert matcher.search("amina notun") is None
@@ -0,0 +1,30 @@
+# user-002: স্ট্যাটস মেমরিতে জমিয়ে একসাথে লেখা হয়
+import asyncio
+
+import bot
+
+
+def test_stats_close_waits_for_running_flush(slow_storage):
+    async def run():
+        stats = bot.StatsAggregator(flush_interval=0.01)
+        stats.start()
+        stats.increment("passed_users")
+        await asyncio.sleep(0.05)
+        await stats.close()
+
+    asyncio.run(run())
+    assert slow_storage.stats == {"passed_users": 1}
+
+
+def test_increments_are_batched_into_one_write(slow_storage):
+    async def run():
+        stats = bot.StatsAggregator(flush_interval=60)
+        stats.start()
+        for _ in range(5):
+            stats.increment("total_interviews")
+        stats.increment_many({"passed_users": 2, "total_interviews": 1})
+        await stats.close()
+
+    asyncio.run(run())
+    assert slow_storage.stats == {"total_interviews": 6, "passed_users": 2}
+    assert slow_storage.ops["increment_stats"] == 1
@@ -0,0 +1,103 @@
+# user-010: SQLite আর মেমরি ব্যাকএন্ড একই অপারেশনে একই ফলাফল দেয় কিনা
+import asyncio
+import sqlite3
+
+import pytest
+
+import bot
+
+
+USERS = {
+    "101": {"state": "PASSED", "passed": True, "updated_at": 300, "answers": [{"qid": 1, "a": "x"}]},
+    "102": {"state": "INTERVIEW", "passed": False, "updated_at": 200},
+    "103": {"state": "PASSED", "passed": True, "updated_at": 200},
+    "104": {"state": "IDLE", "updated_at": 100},
+    "105": {"state": "PASSED", "passed": True},  # updated_at নেই: order_by করলে বাদ যায়
+    "106": {"state": "INTERVIEW", "passed": False, "updated_at": 200},
+    "107": {"state": "IDLE", "updated_at": 50},
+}
+
+
+async def scenario(storage):
+    result = {}
+    for uid, data in USERS.items():
+        await storage.set_user(uid, data)
+    await storage.set_user("102", {"q_index": 3})
+    # append এ আগে থেকে থাকা আইটেম আবার যোগ হয় না (ArrayUnion এর মতো)
+    await storage.update_users([
+        ("101", {"q_index": 5}, {"answers": [{"qid": 1, "a": "x"}, {"qid": 2, "a": "y"}]}),
+        (106, {}, {"answers": [{"qid": 1, "a": "z"}]}),
+        ("104", {}, {}),
+    ])
+    await storage.delete_user("107")
+    await storage.delete_user("999")
+    result["users"] = {uid: await storage.get_user(uid) for uid in [*USERS, "999"]}
+
+    queries = {
+        "passed": [("state", "==", "PASSED")],
+        "bool": [("passed", "==", True)],
+        "not_passed": [("state", "!=", "PASSED")],
+        "range": [("updated_at", ">=", 100), ("updated_at", "<", 300)],
+        "none": [],
+    }
+    for name, where in queries.items():
+        result[f"query_{name}"] = await storage.query_users(where)
+        result[f"page_{name}"] = await storage.query_users(where, after="102", limit=2)
+        result[f"ordered_{name}"] = await storage.query_users(where, order_by="updated_at")
+        result[f"ordered_page_{name}"] = await storage.query_users(where, after=(200, "103"), limit=2, order_by="updated_at")
+        result[f"iter_{name}"] = [item async for item in storage.iter_users(where, page_size=2)]
+        result[f"iter_ordered_{name}"] = [item async for item in storage.iter_users(where, page_size=2, order_by="updated_at")]
+
+    result["config_empty"] = await storage.get_config()
+    await storage.set_config({"group_reply_window": 5, "keywords": ["hi"]})
+    await storage.set_config({"group_reply_window": 3})
+    result["config"] = await storage.get_config()
+
+    await storage.increment_stats({"passed_users": 1, "total_interviews": 2})
+    await storage.increment_stats({"passed_users": 2})
+    result["stats"] = await storage.get_stats()
+    return result
+
+
+def run_scenario(storage):
+    async def run():
+        try:
+            return await scenario(storage)
+        finally:
+            await storage.close()
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def results(tmp_path):
+    return run_scenario(bot.SQLiteStorage(str(tmp_path / "bot.db"))), run_scenario(bot.MemoryStorage())
+
+
+def test_sqlite_and_memory_agree(results):
+    sqlite_result, memory_result = results
+    assert sqlite_result.keys() == memory_result.keys()
+    for key in memory_result:
+        assert sqlite_result[key] == memory_result[key], key
+
+
+def test_scenario_results(results):
+    _, result = results
+    assert result["users"]["101"]["answers"] == [{"qid": 1, "a": "x"}, {"qid": 2, "a": "y"}]
+    assert result["users"]["102"]["q_index"] == 3 and result["users"]["102"]["state"] == "INTERVIEW"
+    assert result["users"]["107"] is None and result["users"]["999"] is None
+    assert [uid for uid, _ in result["query_passed"]] == ["101", "103", "105"]
+    assert [uid for uid, _ in result["page_none"]] == ["103", "104"]
+    # একই updated_at হলে id দিয়ে সাজানো, আর after=(200, "103") এর পরে ঠিক পরেরটা থেকে শুরু
+    assert [uid for uid, _ in result["ordered_none"]] == ["104", "102", "103", "106", "101"]
+    assert [uid for uid, _ in result["ordered_page_none"]] == ["106", "101"]
+    assert [uid for uid, _ in result["iter_ordered_range"]] == ["104", "102", "103", "106"]
+    assert len(result["iter_none"]) == 6
+    assert result["config_empty"] is None
+    assert result["config"] == {"group_reply_window": 3, "keywords": ["hi"], "_version": 2}
+    assert result["stats"] == {"passed_users": 3, "total_interviews": 2}
+
+
+def test_sqlite_uses_wal(tmp_path):
+    path = str(tmp_path / "bot.db")
+    run_scenario(bot.SQLiteStorage(path))
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
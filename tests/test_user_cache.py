@@ -0,0 +1,104 @@
+# user-001: write-behind ইউজার ক্যাশ — ফ্লাশ ব্যর্থ/বাতিল হলে রাইট না হারানো, close, evict আর TTL
+import asyncio
+
+import pytest
+
+import bot
+
+
+def test_failed_flush_is_retried_with_newer_writes(slow_storage):
+    async def run():
+        slow_storage.delay, slow_storage.fail = 0, 1
+        cache = bot.UserStateCache(flush_interval=100)
+        cache.start()
+        data = bot.default_user_data()
+        data.update(state="INTERVIEW", answers=[{"qid": 1, "a": "a1"}])
+        await cache.set(1, data)
+        await cache.flush()
+        assert "1" not in slow_storage.users
+        data["answers"].append({"qid": 2, "a": "a2"})
+        data["q_index"] = 2
+        await cache.set(1, data)
+        await cache.close()
+        return slow_storage.users["1"]
+
+    saved = asyncio.run(run())
+    assert saved["state"] == "INTERVIEW"
+    assert saved["q_index"] == 2
+    assert [a["qid"] for a in saved["answers"]] == [1, 2]
+
+
+def test_close_waits_for_running_flush(slow_storage):
+    async def run():
+        cache = bot.UserStateCache(flush_interval=0.01)
+        cache.start()
+        data = bot.default_user_data()
+        await cache.set(1, data)
+        data["state"] = "PASSED"
+        await cache.set(1, data)
+        await asyncio.sleep(0.05)  # ফ্লাশ এখন স্টোরেজ রাইটের মাঝে
+        await cache.close()
+
+    asyncio.run(run())
+    assert slow_storage.users["1"]["state"] == "PASSED"
+
+
+def test_cancelled_flush_keeps_pending_writes(slow_storage):
+    async def run():
+        cache = bot.UserStateCache(flush_interval=100)
+        cache.start()
+        data = bot.default_user_data()
+        data["state"] = "PASSED"
+        await cache.set(1, data)
+        task = asyncio.create_task(cache.flush())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await cache.close()
+
+    asyncio.run(run())
+    assert slow_storage.users["1"]["state"] == "PASSED"
+
+
+def test_evicted_user_is_read_from_inflight_flush(slow_storage):
+    async def run():
+        cache = bot.UserStateCache(max_size=1, flush_interval=100)
+        cache.start()
+        data = bot.default_user_data()
+        data.update(state="INTERVIEW", q_index=5)
+        await cache.set(1, data)
+        flush = asyncio.create_task(cache.flush())
+        await asyncio.sleep(0.01)
+        await cache.get(2)  # ইউজার 1 LRU থেকে বাদ
+        current = await cache.get(1)
+        await flush
+        await cache.close()
+        return current
+
+    current = asyncio.run(run())
+    assert (current["state"], current["q_index"]) == ("INTERVIEW", 5)
+
+
+def test_unsaved_is_pruned_on_eviction(slow_storage):
+    async def run():
+        cache = bot.UserStateCache(max_size=2)
+        for uid in range(10):
+            await cache.get(uid)
+        return cache._unsaved
+
+    assert len(asyncio.run(run())) <= 2
+
+
+def test_count_by_state_skips_expired_entries(slow_storage):
+    async def run():
+        cache = bot.UserStateCache(ttl=60)
+        await cache.set(1, {"state": "INTERVIEW"})
+        await cache.set(2, {"state": "PASSED"})
+        # ইউজার 1 এর মেয়াদ শেষ, কিন্তু এন্ট্রিটা এখনো LRU তে রয়ে গেছে
+        data, _ = cache._entries["1"]
+        cache._entries["1"] = (data, bot.time.monotonic() - 1)
+        return cache.count_by_state()
+
+    assert asyncio.run(run()) == {"PASSED": 1}
+
@@ -0,0 +1,26 @@
+# user-014: ইউজার ডকুমেন্টে শুধু বদলানো ফিল্ড লেখা, লিস্টে শুধু নতুন আইটেম যোগ
+import bot
+
+
+def test_user_delta_fields_and_append():
+    old = {"state": "INTERVIEW", "q_index": 1, "answers": [{"qid": 1, "a": "x"}]}
+    new = {"state": "INTERVIEW", "q_index": 2, "answers": [{"qid": 1, "a": "x"}, {"qid": 2, "a": "y"}]}
+    assert bot.user_delta(old, new) == ({"q_index": 2}, {"answers": [{"qid": 2, "a": "y"}]})
+    assert bot.user_delta(None, new) == (new, {})
+    # লিস্ট ছোট হলে (রিসেট) পুরো ফিল্ডটাই সেট হয়
+    assert bot.user_delta(new, {**new, "answers": []}) == ({"answers": []}, {})
+
+
+def test_merge_delta_keeps_order():
+    first = ({"q_index": 1}, {"answers": [1]})
+    second = ({"q_index": 2}, {"answers": [2]})
+    assert bot.merge_delta(first, second) == ({"q_index": 2}, {"answers": [1, 2]})
+    # নতুন delta ফিল্ডটা পুরো সেট করলে আগের append তার সাথে যোগ হয় না
+    assert bot.merge_delta(first, ({"answers": []}, {})) == ({"q_index": 1, "answers": []}, {})
+    assert bot.merge_delta(({"answers": [1]}, {}), ({}, {"answers": [2]})) == ({"answers": [1, 2]}, {})
+
+
+def test_apply_user_update_skips_existing_items():
+    doc = {"state": "INTERVIEW", "answers": [{"qid": 1, "a": "x"}]}
+    bot.apply_user_update(doc, {"q_index": 2}, {"answers": [{"qid": 1, "a": "x"}, {"qid": 2, "a": "y"}], "tags": ["new"]})
+    assert doc == {"state": "INTERVIEW", "q_index": 2, "answers": [{"qid": 1, "a": "x"}, {"qid": 2, "a": "y"}], "tags": ["new"]}